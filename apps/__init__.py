@@ -21,6 +21,36 @@ def register_blueprints(app):
         module = import_module('apps.{}.routes'.format(module_name))
         app.register_blueprint(module.blueprint)
 
+def register_datatables(app):
+    from apps.dyn_dt.registry import init_registry
+    init_registry(app)
+
+def register_commands(app):
+    from apps.dyn_dt.commands import datatb_cli
+    from apps.home.commands import pages_cli
+    app.cli.add_command(datatb_cli)
+    app.cli.add_command(pages_cli)
+
+def register_conditional_get(app):
+    from apps.cache import init_app
+    init_app(app)
+
+def register_assets(app):
+    from apps.assets import init_app
+    init_app(app)
+
+def register_templating(app):
+    from apps.templating import init_app
+    init_app(app)
+
+def register_preload(app):
+    from apps.preload import init_app
+    init_app(app)
+
+def register_page_cache(app):
+    from apps.home.cache import init_app
+    init_app(app)
+
 from apps.authentication.oauth import github_blueprint, google_blueprint
 
 def create_app(config):
@@ -42,4 +72,11 @@ def create_app(config):
     register_blueprints(app)
     app.register_blueprint(github_blueprint, url_prefix="/login")    
     app.register_blueprint(google_blueprint, url_prefix="/login")    
+    register_datatables(app)
+    register_commands(app)
+    register_conditional_get(app)
+    register_assets(app)
+    register_templating(app)
+    register_preload(app)
+    register_page_cache(app)
     return app
@@ -0,0 +1,221 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, re, json, gzip, hashlib, mimetypes, posixpath, click
+from urllib.parse import parse_qsl
+from flask import current_app, request, send_from_directory, url_for as flask_url_for
+from flask.cli import AppGroup
+from flask_cdn import CDN, url_for as cdn_url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Asset pipeline: `flask assets build` writes content-hashed copies of
+# static/assets/** to static/dist (css/img/... keep their layout), with .gz
+# and .br variants and a manifest (source name -> hashed name). url_for('static')
+# resolves the manifest names and goes through Flask-CDN when CDN_DOMAIN is
+# set; hashed files never change, they are served as immutable.
+
+ASSETS_SOURCE = 'assets'
+ASSETS_DIST = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# sources of the CSS build, not served
+SKIP_DIRS = {'scss'}
+
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.eot', '.ttf', '.otf', '.ico'}
+
+# JS resolves its URLs against the page, only its source map comment is relative to the file
+REFERENCES = {
+    '.css': re.compile(r'''(url\(\s*['"]?|@import\s+['"]|sourceMappingURL=)([^'"\)\s]+)'''),
+    '.js' : re.compile(r'(sourceMappingURL=)(\S+)'),
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def hashed_name(name, content):
+    digest = hashlib.md5(content).hexdigest()[:10]
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def resolve_reference(name, reference):
+    """Static name of a reference found in `name`, None for data:, external and unknown URLs."""
+    path = reference.split('?')[0].split('#')[0]
+    if not path or path.startswith(('data:', 'http:', 'https:', '//')):
+        return None
+    if path.startswith('/static/'):
+        return path[len('/static/'):]
+    if path.startswith('/'):
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+
+
+def references(name, content):
+    pattern = REFERENCES[posixpath.splitext(name)[1].lower()]
+    return pattern.finditer(content.decode('utf-8', 'surrogateescape'))
+
+
+def rewrite_references(name, content, manifest):
+    """CSS / JS content with the references to built assets pointing at their hashed copies."""
+    pattern = REFERENCES[posixpath.splitext(name)[1].lower()]
+
+    def rewrite(match):
+        reference = match.group(2)
+        target = resolve_reference(name, reference)
+        if target not in manifest:
+            return match.group(0)
+        suffix = reference[len(reference.split('?')[0].split('#')[0]):]
+        # the hashed copy lands in the directory of the source, under dist/
+        relative = posixpath.relpath(manifest[target], posixpath.dirname(posixpath.join(ASSETS_DIST, name)))
+        return match.group(1) + relative + suffix
+
+    return pattern.sub(rewrite, content.decode('utf-8', 'surrogateescape')).encode('utf-8', 'surrogateescape')
+
+
+def write_asset(static_folder, name, content):
+    """Writes the hashed file and its precompressed variants; returns the number of files written."""
+    path = os.path.join(static_folder, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    written = 1
+
+    if posixpath.splitext(name)[1].lower() not in COMPRESSIBLE:
+        return written
+
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+
+    for suffix, compressed in variants:
+        # small files may not shrink, the variant would only cost a lookup
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def build_assets(static_folder):
+    """Builds static/dist from static/assets; returns (manifest, files written)."""
+    sources = []
+    for root, dirs, files in os.walk(os.path.join(static_folder, ASSETS_SOURCE)):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for file in sorted(files):
+            sources.append(posixpath.relpath(os.path.join(root, file), static_folder).replace(os.sep, '/'))
+
+    contents = {}
+    for name in sources:
+        with open(os.path.join(static_folder, *name.split('/')), 'rb') as f:
+            contents[name] = f.read()
+
+    manifest, written = {}, 0
+
+    def build(name, content):
+        nonlocal written
+        manifest[name] = posixpath.join(ASSETS_DIST, hashed_name(name, content))
+        written += write_asset(static_folder, manifest[name], content)
+
+    # referenced files first, CSS / JS once every asset they reference has its hashed name
+    pending = [name for name in sources if posixpath.splitext(name)[1].lower() in REFERENCES]
+    for name in sources:
+        if name not in pending:
+            build(name, contents[name])
+
+    while pending:
+        ready = [
+            name for name in pending
+            if not any(resolve_reference(name, match.group(2)) in pending for match in references(name, contents[name]))
+        ]
+        # reference cycles are built with the plain names of the files in the cycle
+        for name in ready or pending[:]:
+            build(name, rewrite_references(name, contents[name], manifest))
+            pending.remove(name)
+
+    with open(os.path.join(static_folder, ASSETS_DIST, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return manifest, written
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, ASSETS_DIST, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def url_for(endpoint, **values):
+    """
+    flask.url_for with the static names resolved through the manifest, and the CDN when configured.
+    Query parameters are passed as arguments (url_for('static', filename=..., v='1.1.0')), a query
+    string left in the filename is merged with them; Flask-CDN adds its timestamp to the same query.
+    """
+    if endpoint == 'static':
+        manifest = current_app.extensions['assets']
+        filename = values.get('filename')
+        if filename and '?' in filename:
+            filename, query = filename.split('?', 1)
+            values = dict(parse_qsl(query), **values)
+            values['filename'] = filename
+        if filename in manifest:
+            values['filename'] = manifest[filename]
+
+    if current_app.config.get('CDN_DOMAIN'):
+        return cdn_url_for(endpoint, **values)
+    return flask_url_for(endpoint, **values)
+
+
+def send_static_file(filename):
+    """The static view, serving the precompressed variant of a hashed asset when the client takes it."""
+    app = current_app
+    if not filename.startswith(ASSETS_DIST + '/'):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    variant = filename
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            variant = filename + suffix
+            break
+
+    response = send_from_directory(app.static_folder, variant, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if variant != filename:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+assets_cli = AppGroup('assets', help='Fingerprinted static assets.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Writes hashed and precompressed copies of static/assets to static/dist, with the manifest."""
+    manifest, written = build_assets(current_app.static_folder)
+    click.echo(f' > {len(manifest)} assets, {written} files written to {os.path.join(current_app.static_folder, ASSETS_DIST)}')
+    if brotli is None:
+        click.echo(' > brotli is not installed, no .br files written (pip install brotli)')
+
+
+def init_app(app):
+    app.cli.add_command(assets_cli)
+
+    manifest = load_manifest(app.static_folder) if app.config.get('ASSETS_MANIFEST') else {}
+    app.extensions['assets'] = manifest
+
+    if manifest:
+        # hashed names replace the mtime query string of Flask-CDN
+        app.config.setdefault('CDN_TIMESTAMP', False)
+    CDN(app)
+
+    app.view_functions['static'] = send_static_file
+    app.jinja_env.globals['url_for'] = url_for
@@ -0,0 +1,144 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, hashlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import chain
+from flask import current_app, request, make_response
+from flask_login import current_user
+from sqlalchemy import select, insert, update, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from apps import db
+
+# Conditional GET: responses computed from a table carry an ETag derived from
+# the write generation of the table and the view state; a matching
+# If-None-Match is answered with 304 before any page query or rendering
+# happens. Every commit writing a table bumps its row in table_generations in
+# the same transaction, so all workers see it and reading it is a primary
+# key lookup. Writes made outside the app's sessions are not seen.
+
+Watermark = namedtuple('Watermark', ['generation', 'last_modified'])
+
+
+class TableGeneration(db.Model):
+    __tablename__ = 'table_generations'
+    name       = db.Column(db.String(64), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    modified   = db.Column(db.DateTime, nullable=True)
+
+
+def table_watermark(aModelClass):
+    """Changes on every commit writing the table, in any process; one primary key lookup."""
+    generations = TableGeneration.__table__
+    row = db.session.execute(
+        select(generations.c.generation, generations.c.modified).where(generations.c.name == aModelClass.__table__.name)
+    ).first()
+    return Watermark(*row) if row else Watermark(0, None)
+
+
+def bump_generations(connection, names):
+    generations = TableGeneration.__table__
+    now = datetime.utcnow()
+    for name in sorted(names):
+        bump = update(generations).where(generations.c.name == name).values(generation=generations.c.generation + 1, modified=now)
+        if connection.execute(bump).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(generations).values(name=name, generation=1, modified=now))
+        except IntegrityError:
+            # another worker wrote the first row meanwhile
+            connection.execute(bump)
+
+
+def written_tables(session):
+    return session.info.setdefault('written_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_flushed_tables(session, flush_context):
+    for instance in chain(session.new, session.dirty, session.deleted):
+        table = getattr(type(instance), '__table__', None)
+        if table is not None:
+            written_tables(session).add(table.name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_executed_tables(orm_execute_state):
+    # bulk INSERT / UPDATE / DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            written_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'before_commit')
+def commit_generations(session):
+    session.flush()
+    tables = session.info.pop('written_tables', ())
+    tables = set(tables) - {TableGeneration.__tablename__}
+    if tables:
+        bump_generations(session.connection(), tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_written_tables(session):
+    session.info.pop('written_tables', None)
+
+
+def user_key():
+    return current_user.get_id() if current_user.is_authenticated else ''
+
+
+def make_etag(*parts):
+    salt = current_app.config.get('ETAG_SALT', '')
+    payload = '|'.join([salt] + [repr(part) for part in parts])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """304 response when the request validators match, None otherwise."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+
+    if request.if_none_match:
+        matches = request.if_none_match.contains_weak(etag)
+    else:
+        # If-Modified-Since has second precision and no view state, only views with a single state pass it
+        matches = bool(last_modified and request.if_modified_since
+                       and request.if_modified_since >= last_modified.replace(microsecond=0, tzinfo=request.if_modified_since.tzinfo))
+
+    if not matches:
+        return None
+
+    response = make_response('', 304)
+    return add_validators(response, etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None):
+    response.set_etag(etag, weak=True)
+    # Last-Modified has second precision: announced only once its second is over,
+    # a later write of the same second would otherwise pass If-Modified-Since
+    if last_modified and last_modified <= datetime.utcnow() - timedelta(seconds=1):
+        response.last_modified = last_modified
+    # cached copies have to be revalidated, which is what the ETag makes cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def templates_version(folder):
+    """Latest template mtime, so a deployment with new templates changes every ETag."""
+    latest = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return str(int(latest))
+
+
+def init_app(app):
+    if not app.config.get('ETAG_SALT'):
+        app.config['ETAG_SALT'] = templates_version(app.template_folder)
@@ -4,10 +4,18 @@ Copyright (c) 2019 - present AppSeed.us
 """
 
 from apps.charts import blueprint
-from flask import render_template
+from flask import render_template, make_response
 from apps.models import Product
+from apps.cache import table_watermark, make_etag, user_key, not_modified, add_validators
 
 @blueprint.route('/charts')
 def charts():
+    watermark = table_watermark(Product)
+    etag = make_etag('charts', user_key(), watermark)
+    response = not_modified(etag, watermark.last_modified)
+    if response:
+        return response
+
     products = [{'name': product.name, 'price': product.price} for product in Product.get_list()]
-    return render_template('charts/index.html', segment='charts', products=products)
\ No newline at end of file
+    response = make_response(render_template('charts/index.html', segment='charts', products=products))
+    return add_validators(response, etag, watermark.last_modified)
\ No newline at end of file
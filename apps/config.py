@@ -80,6 +80,82 @@ class Config(object):
         "products": "apps.models.Product"
     }
 
+    # Pagination mode per model: 'keyset' (cursor based) or 'page' (default, OFFSET based)
+    DYNAMIC_DATATB_PAGINATION = {
+        "products": "keyset"
+    }
+
+    # Row count strategy per model: 'exact' (default), 'window', 'cached' or 'estimate'
+    DYNAMIC_DATATB_COUNT = {
+        "products": "estimate"
+    }
+
+    # Seconds a worker keeps a cached row count ('cached' / 'estimate' strategies)
+    DYNAMIC_DATATB_COUNT_TTL = int(os.getenv('DYNAMIC_DATATB_COUNT_TTL', 30))
+
+    # Seconds a worker keeps the cached datatable preferences (hide/show, filters, page size)
+    DYNAMIC_DATATB_PREFS_TTL = int(os.getenv('DYNAMIC_DATATB_PREFS_TTL', 60))
+
+    # Full-text index (SQLite FTS5 / PostgreSQL GIN) behind the datatable search box
+    DYNAMIC_DATATB_FTS = os.getenv('DYNAMIC_DATATB_FTS', 'True') == 'True'
+
+    # Rows fetched (and encoded) per round trip by the streaming CSV export
+    DYNAMIC_DATATB_EXPORT_BATCH = int(os.getenv('DYNAMIC_DATATB_EXPORT_BATCH', 1000))
+
+    # Processes used to encode large exports in parallel (0 / 1 = serial export); every process
+    # encodes partitions of DYNAMIC_DATATB_EXPORT_PARTITION_ROWS rows, at most 2 per process are held in memory
+    DYNAMIC_DATATB_EXPORT_WORKERS = int(os.getenv('DYNAMIC_DATATB_EXPORT_WORKERS', 0))
+    DYNAMIC_DATATB_EXPORT_PARTITION_ROWS = int(os.getenv('DYNAMIC_DATATB_EXPORT_PARTITION_ROWS', 20000))
+
+    # Files written by background export jobs, reused while younger than the TTL (seconds)
+    EXPORT_ARTIFACTS_DIR = os.getenv('EXPORT_ARTIFACTS_DIR', os.path.join(BASE_DIR, 'exports'))
+    EXPORT_ARTIFACTS_TTL = int(os.getenv('EXPORT_ARTIFACTS_TTL', 600))
+
+    # Seconds a worker keeps a page of FK lookup options (typeahead in the datatable forms)
+    DYNAMIC_DATATB_LOOKUP_TTL = int(os.getenv('DYNAMIC_DATATB_LOOKUP_TTL', 60))
+
+    # Bulk CSV import: rows per INSERT batch; uploads larger than DYNAMIC_DATATB_IMPORT_ASYNC_BYTES run as Celery jobs
+    DYNAMIC_DATATB_IMPORT_BATCH = int(os.getenv('DYNAMIC_DATATB_IMPORT_BATCH', 1000))
+    DYNAMIC_DATATB_IMPORT_ASYNC_BYTES = int(os.getenv('DYNAMIC_DATATB_IMPORT_ASYNC_BYTES', 5 * 1024 * 1024))
+    IMPORT_UPLOADS_DIR = os.getenv('IMPORT_UPLOADS_DIR', os.path.join(BASE_DIR, 'imports'))
+
+    # Filter / sort usage of the datatables, read by `flask datatb index-advisor` (empty = disabled),
+    # e.g. DYNAMIC_DATATB_USAGE_LOG=apps/exports/dt_usage.log; rotated once past the size limit
+    DYNAMIC_DATATB_USAGE_LOG = os.getenv('DYNAMIC_DATATB_USAGE_LOG', '')
+    DYNAMIC_DATATB_USAGE_LOG_MAX_BYTES = int(os.getenv('DYNAMIC_DATATB_USAGE_LOG_MAX_BYTES', 10 * 1024 * 1024))
+
+    # Mixed into every ETag; defaults to the latest template mtime so deployments revalidate
+    ETAG_SALT = os.getenv('ETAG_SALT', '')
+
+    # Seconds the rendered home pages are served from the in-process page cache (0 = disabled)
+    PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 300))
+    PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 256))
+    # Usernames allowed to POST /page-cache/purge (comma separated, empty = nobody)
+    PAGE_CACHE_ADMINS = [name.strip() for name in os.getenv('PAGE_CACHE_ADMINS', '').split(',') if name.strip()]
+
+    # Rendered layout includes kept by the {% cache %} template tag (seconds, 0 = disabled)
+    TEMPLATE_FRAGMENT_CACHE_TTL = int(os.getenv('TEMPLATE_FRAGMENT_CACHE_TTL', 300))
+    TEMPLATE_FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('TEMPLATE_FRAGMENT_CACHE_MAX_ENTRIES', 512))
+
+    # Compiled templates shared by the workers and kept across restarts (empty = in-memory only)
+    JINJA_BYTECODE_CACHE_DIR = os.getenv('JINJA_BYTECODE_CACHE_DIR', os.path.join(BASE_DIR, 'jinja_cache'))
+
+    # Strip whitespace and comments from the .html templates once, when they are compiled
+    TEMPLATES_MINIFY = os.getenv('TEMPLATES_MINIFY', 'False') == 'True'
+
+    # Compile every template in create_app instead of on the first request that uses it
+    TEMPLATES_WARMUP = os.getenv('TEMPLATES_WARMUP', 'False') == 'True'
+
+    # Static copies of the anonymous home pages (`flask pages prerender`), served by nginx
+    PRERENDER_DIR = os.getenv('PRERENDER_DIR', os.path.join(os.path.dirname(BASE_DIR), 'prerendered'))
+
+    # Resolve url_for('static') through static/dist/manifest.json (`flask assets build`)
+    ASSETS_MANIFEST = os.getenv('ASSETS_MANIFEST', 'False') == 'True'
+
+    # Link: rel=preload headers (and 103 Early Hints where the server supports them) for the CSS, JS and fonts of each page
+    PRELOAD_HEADERS = os.getenv('PRELOAD_HEADERS', 'True') == 'True'
+
+    # Static files are served from this host when set (Flask-CDN)
     CDN_DOMAIN = os.getenv('CDN_DOMAIN')
     CDN_HTTPS = os.getenv('CDN_HTTPS', True)
 
@@ -91,6 +167,9 @@ class ProductionConfig(Config):
     REMEMBER_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_DURATION = 3600
 
+    TEMPLATES_MINIFY = os.getenv('TEMPLATES_MINIFY', 'True') == 'True'
+    ASSETS_MANIFEST  = os.getenv('ASSETS_MANIFEST', 'True') == 'True'
+
 class DebugConfig(Config):
     DEBUG = True
 
@@ -0,0 +1,282 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, re, json, uuid
+from collections import namedtuple, Counter
+from sqlalchemy import select, insert, inspect, func, text, Index, Table, Column, MetaData
+from apps.dyn_dt.filters import prefix_clause
+from apps.dyn_dt.pagination import keyset_order
+
+# Index advisor: turns the usage log into B-tree index recommendations,
+# following the Equality -> Sort -> Range column order. Prefix filters
+# compare lower(column), their index entry is the expression 'lower(column)'.
+# The EXPLAIN estimate never alters the live table: PostgreSQL plans with a
+# hypothetical index (hypopg extension), other engines with a temporary copy.
+
+EQUALITY_OPERATORS = ('eq', 'in')
+RANGE_OPERATORS = ('range', 'prefix')
+
+LOWER_EXPRESSION = re.compile(r'^lower\((\w+)\)$')
+
+Recommendation = namedtuple('Recommendation', ['model', 'table', 'columns', 'hits', 'shape', 'before', 'after'])
+Plan = namedtuple('Plan', ['cost', 'detail'])
+
+
+def range_element(column, op):
+    return f'lower({column})' if op == 'prefix' else column
+
+
+def index_element(table, element):
+    """Column or lower(column) expression of an index entry."""
+    match = LOWER_EXPRESSION.match(element)
+    if match:
+        return func.lower(table.columns[match.group(1)])
+    return table.columns[element]
+
+
+def index_columns(filters, order_by):
+    equality = sorted({column for column, op in filters if op in EQUALITY_OPERATORS})
+    ranges = sorted({range_element(column, op) for column, op in filters if op in RANGE_OPERATORS} - set(equality))
+
+    columns = list(equality)
+    if order_by != 'id' and order_by not in columns:
+        columns.append(order_by)
+    if ranges and ranges[0] not in columns:
+        columns.append(ranges[0])
+    return tuple(columns)
+
+
+def existing_indexes(connection, table):
+    inspector = inspect(connection)
+    indexes = []
+    for index in inspector.get_indexes(table.name):
+        # expression entries have no column name, 'lower("name")' is compared as 'lower(name)'
+        expressions = index.get('expressions') or index['column_names']
+        indexes.append(tuple(
+            column or re.sub(r'[\s"`]', '', expression).lower()
+            for column, expression in zip(index['column_names'], expressions)
+        ))
+    indexes.append(tuple(inspector.get_pk_constraint(table.name).get('constrained_columns') or ()))
+    return indexes
+
+
+def recommend(usage, registry, connection, min_hits=1, limit=None, explain=False):
+    """
+    Recommendations per model, most used first; drops indexes already covered by an existing one.
+    With `explain`, each one carries its before / after plans and the ones not changing the plan are dropped.
+    """
+    candidates = Counter()
+    shapes = {}
+
+    for (model, filters, order_by, search), hits in usage.items():
+        meta = registry.get(model)
+        if not meta:
+            continue
+
+        filters = tuple((column, op) for column, op in filters if column in meta.db_fields)
+        if order_by not in meta.db_fields:
+            order_by = 'id'
+
+        columns = index_columns(filters, order_by)
+        if not columns:
+            continue
+
+        candidates[(model, columns)] += hits
+        # the most frequent query shape is the representative one for EXPLAIN
+        if hits > shapes.get((model, columns), (0, None))[0]:
+            shapes[(model, columns)] = (hits, (filters, order_by))
+
+    # (a, b) serves the queries of (a,) as well; shortest first, so (a,) -> (a, b) -> (a, b, c) adds up
+    for model, columns in sorted(candidates, key=lambda key: len(key[1])):
+        for other_model, other in candidates:
+            if other_model == model and len(other) > len(columns) and other[:len(columns)] == columns:
+                candidates[(other_model, other)] += candidates.pop((model, columns))
+                break
+
+    recommendations = []
+    indexes = {}
+    for (model, columns), hits in candidates.most_common():
+        if hits < min_hits or (limit and len(recommendations) >= limit):
+            continue
+
+        meta = registry.get(model)
+        table = meta.model.__table__
+        if table.name not in indexes:
+            indexes[table.name] = existing_indexes(connection, table)
+        if any(index[:len(columns)] == columns for index in indexes[table.name]):
+            continue
+
+        recommendation = Recommendation(model, table.name, columns, hits, shapes[(model, columns)][1], None, None)
+        if explain:
+            recommendation = estimate(connection, registry, recommendation)
+            if not improves(recommendation):
+                continue
+        recommendations.append(recommendation)
+
+    return recommendations
+
+
+def improves(recommendation):
+    """False when the estimate shows the same plan (and no lower cost) with the index."""
+    before, after = recommendation.before, recommendation.after
+    if before is None or after is None:
+        return True
+    if before.cost is not None and after.cost is not None:
+        return after.cost < before.cost
+    return after.detail != before.detail
+
+
+# EXPLAIN
+
+def sample_statement(connection, table, filters, order_by, limit=25):
+    """A representative page query, filter values taken from an existing row."""
+    sample = connection.execute(select(table).limit(1)).mappings().first()
+    if sample is None:
+        return None
+
+    criteria = []
+    for name, op in filters:
+        column = table.columns[name]
+        value = sample[name]
+        if value is None:
+            criteria.append(column.is_(None))
+        elif op == 'in':
+            criteria.append(column.in_([value]))
+        elif op == 'prefix':
+            criteria.append(prefix_clause(column, str(value)[:3]))
+        elif op in RANGE_OPERATORS:
+            criteria.append(column >= value)
+        else:
+            criteria.append(column == value)
+
+    order = keyset_order(table.columns[order_by], table.columns['id'])
+    return select(table).where(*criteria).order_by(*order).limit(limit)
+
+
+def explain(connection, statement):
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).all()
+        return Plan(None, '; '.join(row[-1] for row in rows))
+
+    if dialect == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        return Plan(root['Total Cost'], root['Node Type'])
+
+    if dialect in ('mysql', 'mariadb'):
+        plan = json.loads(connection.exec_driver_sql('EXPLAIN FORMAT=JSON ' + sql).scalar())
+        return Plan(float(plan['query_block']['cost_info']['query_cost']), plan['query_block'].get('table', {}).get('access_type'))
+
+    return Plan(None, 'EXPLAIN is not supported for ' + dialect)
+
+
+def index_name(table, columns):
+    return 'ix_{}_{}'.format(table, '_'.join(re.sub(r'\W+', '_', column).strip('_') for column in columns))[:60]
+
+
+def hypothetical_plan(connection, table, columns, statement):
+    """Plan of `statement` with a hypopg index on `columns`; only this session sees it."""
+    if connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")).first() is None:
+        return Plan(None, 'needs the hypopg extension (CREATE EXTENSION hypopg)')
+
+    preparer = connection.dialect.identifier_preparer
+    elements = []
+    for column in columns:
+        match = LOWER_EXPRESSION.match(column)
+        if match:
+            elements.append('lower({}) text_pattern_ops'.format(preparer.quote(match.group(1))))
+        else:
+            elements.append(preparer.quote(column))
+
+    ddl = 'CREATE INDEX ON {} ({})'.format(preparer.format_table(table), ', '.join(elements))
+    connection.execute(text('SELECT * FROM hypopg_create_index(:ddl)'), {'ddl': ddl})
+    try:
+        return explain(connection, statement)
+    finally:
+        connection.execute(text('SELECT hypopg_reset()'))
+
+
+def scratch_copy(connection, table):
+    """Temporary copy of `table` and of its existing indexes, private to the connection."""
+    scratch = Table(
+        'scratch_' + table.name, MetaData(),
+        *[Column(c.name, c.type, primary_key=c.primary_key) for c in table.columns],
+        prefixes=['TEMPORARY'],
+    )
+    scratch.create(connection)
+    connection.execute(insert(scratch).from_select([c.name for c in table.columns], select(table)))
+
+    for columns in existing_indexes(connection, table):
+        if columns and all(LOWER_EXPRESSION.match(c) or c in scratch.columns for c in columns):
+            Index(index_name(scratch.name, columns), *[index_element(scratch, c) for c in columns]).create(connection)
+    return scratch
+
+
+def estimate(connection, registry, recommendation):
+    """EXPLAIN the representative query without, then with the index; the live table is not altered."""
+    meta = registry.get(recommendation.model)
+    table = meta.model.__table__
+    filters, order_by = recommendation.shape
+
+    if connection.dialect.name == 'postgresql':
+        statement = sample_statement(connection, table, filters, order_by)
+        if statement is None:
+            return recommendation
+        before = explain(connection, statement)
+        after = hypothetical_plan(connection, table, recommendation.columns, statement)
+        return recommendation._replace(before=before, after=after)
+
+    scratch = scratch_copy(connection, table)
+    try:
+        statement = sample_statement(connection, scratch, filters, order_by)
+        if statement is None:
+            return recommendation
+        before = explain(connection, statement)
+        Index(index_name(scratch.name, recommendation.columns),
+              *[index_element(scratch, c) for c in recommendation.columns]).create(connection)
+        after = explain(connection, statement)
+    finally:
+        scratch.drop(connection)
+
+    return recommendation._replace(before=before, after=after)
+
+
+# Alembic migration
+
+def write_migration(directory, recommendations):
+    """Adds a revision on top of the current head under `directory`/versions; returns its path."""
+    from alembic.config import Config as AlembicConfig
+    from alembic.script import ScriptDirectory
+
+    os.makedirs(os.path.join(directory, 'versions'), exist_ok=True)
+
+    alembic_config = AlembicConfig(os.path.join(directory, 'alembic.ini'))
+    alembic_config.set_main_option('script_location', directory)
+    scripts = ScriptDirectory.from_config(alembic_config)
+
+    upgrades, downgrades = [], []
+    if any(LOWER_EXPRESSION.match(column) for recommendation in recommendations for column in recommendation.columns):
+        # LIKE 'v%' only uses a PostgreSQL index outside the C locale with text_pattern_ops
+        upgrades.append("pattern_ops = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''")
+
+    for recommendation in recommendations:
+        name = index_name(recommendation.table, recommendation.columns)
+        elements = ', '.join(
+            f"sa.text({column!r} + pattern_ops)" if LOWER_EXPRESSION.match(column) else repr(column)
+            for column in recommendation.columns
+        )
+        upgrades.append(f"op.create_index({name!r}, {recommendation.table!r}, [{elements}], unique=False)")
+        downgrades.insert(0, f"op.drop_index({name!r}, table_name={recommendation.table!r})")
+
+    script = scripts.generate_revision(
+        uuid.uuid4().hex[:12], 'datatable index advisor', head='head', refresh=True,
+        upgrades='\n    '.join(upgrades), downgrades='\n    '.join(downgrades),
+    )
+    return script.path
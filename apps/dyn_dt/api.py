@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+from collections import namedtuple
+from datetime import datetime, date, time
+from decimal import Decimal
+from enum import Enum
+
+# Server-side DataTables protocol: https://datatables.net/manual/server-side
+# Besides the DataTables parameters (draw, start, length, order[i][...],
+# search[value], columns[i][data]) the endpoint takes the short forms used by
+# the rest of the app (columns=a,b  order_by  dir  search) and keyset cursors
+# (after / before) instead of start.
+
+MAX_LENGTH = 1000
+
+DataRequest = namedtuple('DataRequest', ['draw', 'columns', 'order_by', 'descending', 'search', 'start', 'length', 'after', 'before'])
+
+
+def indexed_args(args, name, key):
+    """Values of `name[i][key]` parameters, in index order."""
+    values = {}
+    prefix = name + '['
+    suffix = '][' + key + ']'
+    for arg, value in args.items():
+        if arg.startswith(prefix) and arg.endswith(suffix):
+            index = arg[len(prefix):-len(suffix)]
+            if index.isdigit():
+                values[int(index)] = value
+    return [values[index] for index in sorted(values)]
+
+
+def parse_data_request(args, fields, default_length=25):
+    columns = [c for c in indexed_args(args, 'columns', 'data') if c in fields]
+    if not columns and args.get('columns'):
+        columns = [c for c in args.get('columns').split(',') if c in fields]
+    if not columns:
+        columns = list(fields)
+
+    order_by = args.get('order_by')
+    descending = args.get('dir', 'asc') == 'desc'
+
+    order_column = indexed_args(args, 'order', 'column')
+    if order_column:
+        requested = indexed_args(args, 'columns', 'data')
+        index = int(order_column[0]) if order_column[0].isdigit() else -1
+        order_by = requested[index] if 0 <= index < len(requested) else None
+        descending = (indexed_args(args, 'order', 'dir') or ['asc'])[0] == 'desc'
+
+    if order_by not in fields:
+        order_by = 'id'
+
+    length = args.get('length', default_length, type=int)
+    if length < 0:
+        # DataTables sends -1 for "all"
+        length = MAX_LENGTH
+    length = min(length or default_length, MAX_LENGTH)
+
+    return DataRequest(
+        draw=args.get('draw', 0, type=int),
+        columns=columns,
+        order_by=order_by,
+        descending=descending,
+        search=args.get('search[value]') or args.get('search') or None,
+        start=max(args.get('start', 0, type=int) or 0, 0),
+        length=length,
+        after=args.get('after'),
+        before=args.get('before'),
+    )
+
+
+def json_value(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def row_dict(item, columns):
+    return {column: json_value(getattr(item, column, None)) for column in columns}
+
+
+def form_value(value):
+    """Value as an HTML form control expects it."""
+    if value is None:
+        return ''
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+    return json_value(value)
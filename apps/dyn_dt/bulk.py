@@ -0,0 +1,67 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+from sqlalchemy import delete, update
+from apps.dyn_dt.filters import coerce_value
+
+# Set-based bulk operations: one DELETE / UPDATE ... WHERE per call, id lists
+# split in chunks so the IN list stays below the driver parameter limits
+# (999 host parameters on older SQLite builds).
+
+ID_CHUNK_SIZE = 500
+
+
+def parse_ids(values):
+    """Ids from form values, either repeated or comma separated; invalid ones are dropped."""
+    ids = set()
+    for value in values:
+        for item in str(value).split(','):
+            item = item.strip()
+            if item.isdigit():
+                ids.add(int(item))
+    return sorted(ids)
+
+
+def chunks(ids, size=ID_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def bulk_delete(session, aModelClass, ids=None, criteria=None):
+    """Deletes the rows with the given ids, or matching `criteria`; returns the affected row count."""
+    table = aModelClass.__table__
+
+    if ids is not None:
+        affected = 0
+        for chunk in chunks(ids):
+            affected += session.execute(delete(table).where(table.c.id.in_(chunk))).rowcount
+        return affected
+
+    return session.execute(delete(table).where(*criteria)).rowcount
+
+
+def bulk_update(session, aModelClass, values, ids=None, criteria=None):
+    """Sets `values` (column -> value) on the rows with the given ids, or matching `criteria`."""
+    table = aModelClass.__table__
+
+    if ids is not None:
+        affected = 0
+        for chunk in chunks(ids):
+            affected += session.execute(update(table).where(table.c.id.in_(chunk)).values(values)).rowcount
+        return affected
+
+    return session.execute(update(table).where(*criteria).values(values)).rowcount
+
+
+def column_value(column, value):
+    """Form value for a bulk update of `column`; raises ValueError when it does not fit."""
+    if value is None or value == '':
+        if not column.nullable:
+            raise ValueError(f'{column.name}: value required')
+        return None
+    try:
+        return coerce_value(column, value)
+    except ValueError:
+        raise ValueError(f'{column.name}: invalid value {value!r}')
@@ -0,0 +1,131 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, click, tempfile
+from flask import current_app
+from flask.cli import AppGroup
+from apps import db
+from apps.dyn_dt.usage import usage_log, read_usage
+from apps.dyn_dt.advisor import recommend, write_migration
+from apps.dyn_dt.importer import import_csv, sample_csv, ImportAborted
+from apps.dyn_dt.registry import get_model_meta
+from apps.dyn_dt.lookup import lookup_cache
+from apps.dyn_dt.counting import count_cache
+
+
+def plan_summary(plan):
+    if plan is None:
+        return '-'
+    if plan.cost is None:
+        return plan.detail
+    return '{:.2f} ({})'.format(plan.cost, plan.detail)
+
+
+datatb_cli = AppGroup('datatb', help='Dynamic datatables.')
+
+
+@datatb_cli.command('index-advisor')
+@click.option('--model', 'models', multiple=True, help='DYNAMIC_DATATB path to analyse (repeatable, default: all).')
+@click.option('--min-hits', default=1, show_default=True, help='Ignore query shapes used less often.')
+@click.option('--limit', default=10, show_default=True, help='Maximum number of indexes to recommend.')
+@click.option('--explain/--no-explain', default=None,
+              help='EXPLAIN before/after estimate, drops the indexes that do not change the plan '
+                   '(default: on SQLite only; PostgreSQL needs hypopg, other engines copy the table).')
+@click.option('--dry-run', is_flag=True, help='Print the recommendations without writing a migration.')
+def index_advisor(models, min_hits, limit, explain, dry_run):
+    """Recommends indexes for the datatables from the usage log and emits an Alembic migration."""
+    usage_log.flush()
+    usage = read_usage(current_app.config.get('DYNAMIC_DATATB_USAGE_LOG'))
+    if models:
+        usage = {shape: hits for shape, hits in usage.items() if shape[0] in models}
+
+    if not usage:
+        click.echo(' > No datatable usage recorded yet (DYNAMIC_DATATB_USAGE_LOG).')
+        return
+
+    registry = current_app.extensions['dyn_dt_registry']
+    if explain is None:
+        explain = db.engine.dialect.name == 'sqlite'
+
+    with db.engine.connect() as connection:
+        recommendations = recommend(usage, registry, connection, min_hits, limit, explain)
+        connection.rollback()
+
+    if not recommendations:
+        click.echo(' > Existing indexes already cover the recorded queries (or a new one would not change the plan).')
+        return
+
+    for recommendation in recommendations:
+        click.echo(' > {}({})  hits={}'.format(recommendation.table, ', '.join(recommendation.columns), recommendation.hits))
+        if explain:
+            click.echo('     before: ' + plan_summary(recommendation.before))
+            click.echo('     after : ' + plan_summary(recommendation.after))
+
+    if dry_run:
+        return
+
+    directory = current_app.extensions['migrate'].directory if 'migrate' in current_app.extensions else 'migrations'
+    click.echo(' > Migration: ' + write_migration(directory, recommendations))
+
+
+def datatable_model(path):
+    meta = get_model_meta(path)
+    if not meta:
+        raise click.BadParameter(f'not a DYNAMIC_DATATB model: {path}', param_hint='PATH')
+    return meta.model
+
+
+def print_import(result):
+    rate = result.inserted / result.seconds if result.seconds else 0
+    click.echo(' > {} rows, {} inserted, {} skipped in {:.2f} s ({:,.0f} rows/s)'.format(
+        result.rows, result.inserted, result.skipped, result.seconds, rate))
+    for line, message in result.errors:
+        click.echo(f'     line {line}: {message}')
+
+
+@datatb_cli.command('import')
+@click.argument('path')
+@click.argument('csv_file', type=click.File('rb'))
+@click.option('--batch-size', default=None, type=int, help='Rows per INSERT batch (default: DYNAMIC_DATATB_IMPORT_BATCH).')
+@click.option('--keep-ids', is_flag=True, help='Insert the id column of the file instead of letting the database assign ids.')
+def import_command(path, csv_file, batch_size, keep_ids):
+    """Bulk imports CSV_FILE (the CSV export shape) into the PATH datatable model."""
+    aModelClass = datatable_model(path)
+    batch_size = batch_size or current_app.config['DYNAMIC_DATATB_IMPORT_BATCH']
+
+    try:
+        result = import_csv(db.session, aModelClass, csv_file, batch_size, keep_ids=keep_ids)
+    except ImportAborted as e:
+        raise click.ClickException(f'line {e.line}: {e} ({e.committed} rows committed before it)')
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    finally:
+        lookup_cache.invalidate(aModelClass)
+        count_cache.invalidate(aModelClass)
+
+    print_import(result)
+
+
+@datatb_cli.command('import-benchmark')
+@click.argument('path')
+@click.option('--rows', default=100000, show_default=True, help='Synthetic rows to import.')
+@click.option('--batch-size', 'batch_sizes', multiple=True, type=int, help='Batch size to measure (repeatable).')
+def import_benchmark(path, rows, batch_sizes):
+    """Measures the import rate (rows/s) of the PATH model; the inserted rows are rolled back."""
+    aModelClass = datatable_model(path)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as sample:
+        sample_csv(aModelClass, rows, sample)
+
+    try:
+        for batch_size in batch_sizes or (100, 1000, 5000):
+            click.echo(f' > batch size {batch_size}')
+            with open(sample.name, 'rb') as csv_file:
+                result = import_csv(db.session, aModelClass, csv_file, batch_size, commit=False)
+            db.session.rollback()
+            print_import(result)
+    finally:
+        os.remove(sample.name)
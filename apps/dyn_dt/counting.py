@@ -0,0 +1,137 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import time, threading
+from flask import current_app
+from flask_sqlalchemy.pagination import QueryPagination
+from sqlalchemy import func, text
+from apps import db
+
+# Row count strategies of the datatable pagination (DYNAMIC_DATATB_COUNT):
+#   exact    - a separate SELECT COUNT(*) per page view (Flask-SQLAlchemy default)
+#   window   - COUNT(*) OVER() returned with the page rows, one round trip
+#   cached   - exact count cached per filter / search state, dropped on writes
+#   estimate - planner statistics for unfiltered views, cached otherwise
+
+COUNT_STRATEGIES = ('exact', 'window', 'cached', 'estimate')
+
+# Below this many rows an estimate is not worth it, the table is counted
+ESTIMATE_THRESHOLD = 10000
+
+
+class CountCache(object):
+    """Exact counts per (model, state); a write bumps the model generation and orphans its entries."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._counts = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, aModelClass, state):
+        key = (aModelClass, self._generations.get(aModelClass, 0), state)
+        cached = self._counts.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def set(self, aModelClass, state, count):
+        ttl = current_app.config.get('DYNAMIC_DATATB_COUNT_TTL', 30)
+        with self._lock:
+            if len(self._counts) >= self.max_entries:
+                self._counts.clear()
+            key = (aModelClass, self._generations.get(aModelClass, 0), state)
+            self._counts[key] = (count, time.monotonic() + ttl)
+
+    def invalidate(self, aModelClass):
+        with self._lock:
+            self._generations[aModelClass] = self._generations.get(aModelClass, 0) + 1
+            self._counts = {key: value for key, value in self._counts.items() if key[0] is not aModelClass}
+
+
+count_cache = CountCache()
+
+
+def count_strategy(path):
+    strategy = current_app.config.get('DYNAMIC_DATATB_COUNT', {}).get(path, 'exact')
+    return strategy if strategy in COUNT_STRATEGIES else 'exact'
+
+
+def table_estimate(aModelClass):
+    """Planner row estimate of the whole table, None when the database keeps no usable statistics."""
+    table = aModelClass.__table__.name
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        estimate = db.session.execute(
+            text('SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)'), {'table': table}
+        ).scalar()
+    elif dialect in ('mysql', 'mariadb'):
+        estimate = db.session.execute(
+            text('SELECT table_rows FROM information_schema.tables '
+                 'WHERE table_schema = DATABASE() AND table_name = :table'), {'table': table}
+        ).scalar()
+    else:
+        return None
+
+    # reltuples is -1 for a table never vacuumed / analyzed
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
+def count_rows(query, aModelClass, strategy='exact', state=(), filtered=True):
+    """(row count, estimated) of `query` following `strategy`; 'window' counts like 'exact' here."""
+    if strategy == 'estimate' and not filtered:
+        estimate = table_estimate(aModelClass)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate, True
+
+    if strategy in ('cached', 'estimate'):
+        count = count_cache.get(aModelClass, state)
+        if count is None:
+            count = query.order_by(None).count()
+            count_cache.set(aModelClass, state, count)
+        return count, False
+
+    return query.order_by(None).count(), False
+
+
+class CountedPagination(QueryPagination):
+    """QueryPagination whose total follows a count strategy; `estimated` tells an approximate total."""
+
+    def __init__(self, query, aModelClass, strategy='exact', state=(), filtered=True, **kwargs):
+        self.strategy = strategy
+        self.model = aModelClass
+        self.state = state
+        self.filtered = filtered
+        self.estimated = False
+        self._window_total = None
+        super().__init__(query=query, **kwargs)
+
+    def _query_items(self):
+        if self.strategy != 'window':
+            return super()._query_items()
+
+        query = self._query_args['query'].add_columns(func.count().over().label('dt_total'))
+        rows = query.limit(self.per_page).offset(self._query_offset).all()
+        if rows:
+            self._window_total = rows[0][-1]
+        return [row[0] for row in rows]
+
+    def _query_count(self):
+        if self._window_total is not None:
+            return self._window_total
+        if self.strategy == 'window' and self.page == 1:
+            return 0
+
+        total, self.estimated = count_rows(self._query_args['query'], self.model, self.strategy, self.state, self.filtered)
+        return total
+
+    @property
+    def has_next(self):
+        if self.estimated:
+            return len(self.items) == self.per_page
+        return super().has_next
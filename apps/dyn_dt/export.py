@@ -0,0 +1,285 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, csv, io, zlib, json, time, hashlib, threading
+import multiprocessing
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, select, func, not_
+from sqlalchemy.orm import Session
+from apps.dyn_dt.utils import name_to_class, model_filter_clauses, search_criteria
+from apps.dyn_dt.pagination import keyset_condition, keyset_order
+from apps.dyn_dt.preferences import FilterPref
+
+# Everything a process needs to rebuild the export query, kept picklable
+ExportSpec = namedtuple('ExportSpec', [
+    'class_name',       # dotted model class, e.g. apps.models.Product
+    'fields',           # exported columns
+    'filters',          # saved ModelFilter rows (FilterPref)
+    'filter_fields',
+    'search',
+    'search_fields',
+    'fk_fields',
+    'order_by',
+    'fulltext',         # full-text backend of the model (None = ILIKE search)
+], defaults=(None,))
+
+
+def spec_to_json(spec):
+    return json.dumps(spec._asdict(), sort_keys=True)
+
+
+def spec_from_json(data):
+    spec = ExportSpec(**json.loads(data))
+    return spec._replace(filters=[FilterPref(*filter_data) for filter_data in spec.filters])
+
+
+def row_values(item, fields):
+    row_data = []
+    for field in fields:
+        try:
+            row_data.append(getattr(item, field))
+        except AttributeError:
+            row_data.append('')
+    return row_data
+
+
+def iter_csv(items, fields, batch_size=1000, header=True):
+    """Encodes `items` as CSV, yielding one text chunk per `batch_size` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if header:
+        writer.writerow(fields)
+
+    for count, item in enumerate(items, 1):
+        writer.writerow(row_values(item, fields))
+
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    chunk = buffer.getvalue()
+    if chunk:
+        yield chunk
+
+
+def iter_gzip(chunks, encoding='utf-8'):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+# Query building (shared by the serial export and the worker processes)
+
+def export_criteria(aModelClass, spec):
+    criteria = model_filter_clauses(aModelClass, spec.filters, spec.filter_fields)
+    if spec.search:
+        criteria.append(search_criteria(aModelClass, spec.search, spec.search_fields, spec.fk_fields, spec.fulltext))
+    return criteria
+
+
+def export_statement(aModelClass, spec, lower=None, upper=None):
+    """SELECT of the exported rows; `lower`/`upper` bound a (order_by, id) key range [lower, upper)."""
+    column = aModelClass.__table__.columns[spec.order_by]
+    id_column = aModelClass.__table__.columns['id']
+
+    criteria = export_criteria(aModelClass, spec)
+    if lower is not None:
+        criteria.append(not_(keyset_condition(column, id_column, *lower, forward=False)))
+    if upper is not None:
+        criteria.append(keyset_condition(column, id_column, *upper, forward=False))
+
+    return select(aModelClass).where(*criteria).order_by(*keyset_order(column, id_column))
+
+
+def iter_serial_csv(session, aModelClass, spec, batch_size):
+    statement = export_statement(aModelClass, spec).execution_options(yield_per=batch_size)
+    return iter_csv(session.execute(statement).scalars(), spec.fields, batch_size)
+
+
+# Range-partitioned export
+
+def partition_bounds(session, aModelClass, spec, partition_rows):
+    """(order_by, id) keys of the first row of each partition of `partition_rows` rows, in export order."""
+    column = aModelClass.__table__.columns[spec.order_by]
+    id_column = aModelClass.__table__.columns['id']
+    criteria = export_criteria(aModelClass, spec)
+
+    numbered = select(
+        column.label('key'), id_column.label('id'),
+        func.row_number().over(order_by=keyset_order(column, id_column)).label('rn'),
+    ).where(*criteria).subquery()
+
+    rows = session.execute(
+        select(numbered.c.key, numbered.c.id).where((numbered.c.rn - 1) % partition_rows == 0).order_by(numbered.c.rn)
+    ).all()
+    return [tuple(row) for row in rows]
+
+
+_engines = {}
+
+def get_engine(database_uri):
+    """Engine private to the current process (export workers, Celery tasks)."""
+    engine = _engines.get(database_uri)
+    if engine is None:
+        engine = _engines[database_uri] = create_engine(database_uri)
+    return engine
+
+
+def export_partition(database_uri, spec, lower, upper, batch_size):
+    """Runs in a worker process: encodes one key range with its own DB connection."""
+    engine = get_engine(database_uri)
+
+    aModelClass = name_to_class(spec.class_name)
+    statement = export_statement(aModelClass, spec, lower, upper).execution_options(yield_per=batch_size)
+
+    with Session(engine) as session:
+        return ''.join(iter_csv(session.execute(statement).scalars(), spec.fields, batch_size, header=False))
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_inherited_engines = []
+
+def dispose_inherited_engines():
+    """Pool initializer: a forked child drops the pooled connections of the parent, without closing them under it."""
+    for engine in _inherited_engines + list(_engines.values()):
+        engine.dispose(close=False)
+
+
+def get_pool(workers, inherited=()):
+    """Process pool shared by all requests of this worker, started on first use; `inherited` are the parent engines."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        _inherited_engines[:] = inherited
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # fork avoids re-importing the app in every child; children never reuse the parent engine
+            method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                                        initializer=dispose_inherited_engines)
+            _pool_workers = workers
+        return _pool
+
+
+def iter_parallel_csv(database_uri, spec, bounds, workers, batch_size, inherited=()):
+    """
+    Yields the header, then each partition in key order; at most 2 x workers partitions
+    (of DYNAMIC_DATATB_EXPORT_PARTITION_ROWS rows) are in flight.
+    """
+    pool = get_pool(workers, inherited)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(spec.fields)
+    yield buffer.getvalue()
+
+    pending = deque()
+    for lower, upper in zip(bounds, bounds[1:] + [None]):
+        pending.append(pool.submit(export_partition, database_uri, spec, lower, upper, batch_size))
+        if len(pending) >= workers * 2:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+# Export artifacts (files written by background jobs)
+
+def artifact_name(path, spec):
+    """Same model, columns, filters, search and ordering -> same file name."""
+    key = [spec.class_name, spec.fields, [(f.key, f.value, f.op) for f in spec.filters], spec.search, spec.order_by]
+    digest = hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()[:16]
+    return f'{path}-{digest}.csv'
+
+
+def fresh_artifact(folder, name, max_age):
+    """Full path of `name` when it exists and is younger than `max_age` seconds."""
+    file_path = os.path.join(folder, name)
+    if os.path.isfile(file_path) and time.time() - os.path.getmtime(file_path) < max_age:
+        return file_path
+    return None
+
+
+def expire_artifacts(folder, max_age):
+    """Removes the artifacts (and leftover temporary files) older than `max_age` seconds; returns how many."""
+    removed = 0
+    if not os.path.isdir(folder):
+        return removed
+
+    for name in os.listdir(folder):
+        if not name.endswith(('.csv', '.tmp')):
+            continue
+        file_path = os.path.join(folder, name)
+        try:
+            if time.time() - os.path.getmtime(file_path) >= max_age:
+                os.remove(file_path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+# One job per artifact: the request starting it writes <artifact>.job with the
+# task id, identical requests get that task until the job removes the file.
+
+def claim_export_job(folder, name, task_id, max_age):
+    """`task_id` when this call owns the export of `name`, the id of the job in flight otherwise."""
+    os.makedirs(folder, exist_ok=True)
+    job_path = os.path.join(folder, name + '.job')
+
+    for _ in range(2):
+        try:
+            fd = os.open(job_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                # a job older than the artifact TTL died without cleaning up
+                if time.time() - os.path.getmtime(job_path) < max_age:
+                    with open(job_path) as f:
+                        return f.read().strip() or task_id
+                os.remove(job_path)
+            except OSError:
+                pass
+            continue
+
+        with os.fdopen(fd, 'w') as f:
+            f.write(task_id)
+        return task_id
+    return task_id
+
+
+def release_export_job(folder, name):
+    try:
+        os.remove(os.path.join(folder, name + '.job'))
+    except OSError:
+        pass
+
+
+def write_csv_artifact(session, aModelClass, spec, file_path, batch_size, progress=None):
+    """Writes the export to `file_path` atomically; `progress(current, total)` is called per batch."""
+    criteria = export_criteria(aModelClass, spec)
+    total = session.execute(select(func.count()).select_from(aModelClass).where(*criteria)).scalar()
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+
+    current = 0
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as output:
+        for chunk in iter_serial_csv(session, aModelClass, spec, batch_size):
+            output.write(chunk)
+            current = min(current + batch_size, total)
+            if progress:
+                progress(current, total)
+
+    os.replace(tmp_path, file_path)
+    return total
@@ -0,0 +1,179 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+from datetime import datetime, date
+from sqlalchemy import and_, false, func
+from sqlalchemy import Integer, Numeric, Float, DateTime, Date, Boolean, Enum, Text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+# Saved filter operators. Except 'contains', all of them compile to
+# comparisons a B-tree index can serve; 'prefix' is case-insensitive and
+# needs an index on lower(column) (the index advisor proposes one).
+OPERATORS = {
+    'eq'       : 'equals',
+    'prefix'   : 'starts with',
+    'range'    : 'between (a..b)',
+    'in'       : 'in list (a,b,c)',
+    'contains' : 'contains',
+}
+
+# column kind -> (default operator, allowed operators)
+KIND_OPERATORS = {
+    'number'   : ('eq',       ('eq', 'range', 'in')),
+    'datetime' : ('range',    ('range', 'eq')),
+    'date'     : ('range',    ('range', 'eq')),
+    'boolean'  : ('eq',       ('eq',)),
+    'enum'     : ('in',       ('in', 'eq')),
+    'string'   : ('prefix',   ('prefix', 'eq', 'in', 'contains')),
+    'text'     : ('contains', ('contains', 'prefix', 'eq')),
+}
+
+
+def column_kind(column):
+    column_type = column.type
+    if isinstance(column_type, Enum):
+        return 'enum'
+    if isinstance(column_type, Boolean):
+        return 'boolean'
+    if isinstance(column_type, (Integer, Numeric, Float)):
+        return 'number'
+    if isinstance(column_type, DateTime):
+        return 'datetime'
+    if isinstance(column_type, Date):
+        return 'date'
+    if isinstance(column_type, Text):
+        return 'text'
+    return 'string'
+
+
+def column_operators(column):
+    """(default operator, allowed operators) for a column."""
+    return KIND_OPERATORS[column_kind(column)]
+
+
+# filters saved before operators existed have no `op` and always ran as 'contains'
+LEGACY_OPERATOR = 'contains'
+
+
+def unset_operator(column):
+    """Operator of a saved filter without `op`."""
+    default, allowed = column_operators(column)
+    return LEGACY_OPERATOR if LEGACY_OPERATOR in allowed else default
+
+
+def effective_operator(column, op):
+    """`op` when the column allows it, the column default otherwise."""
+    if op is None:
+        return unset_operator(column)
+    default, allowed = column_operators(column)
+    return op if op in allowed else default
+
+
+def coerce_value(column, value):
+    """Converts the text typed in the UI to the column type; raises ValueError when it does not fit."""
+    value = value.strip()
+    kind = column_kind(column)
+
+    if kind == 'number':
+        if isinstance(column.type, Integer):
+            return int(value)
+        return float(value)
+    if kind == 'datetime':
+        return datetime.fromisoformat(value)
+    if kind == 'date':
+        return date.fromisoformat(value)
+    if kind == 'boolean':
+        if value.lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if value.lower() in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError(value)
+    if kind == 'enum':
+        enum_class = column.type.enum_class
+        if enum_class:
+            for member in enum_class:
+                if value in (member.name, member.value, str(member)):
+                    return member
+            raise ValueError(value)
+        if value not in column.type.enums:
+            raise ValueError(value)
+    return value
+
+
+def like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class PrefixMatch(ColumnElement):
+    """lower(column) starts with the lowercase `prefix`."""
+    type = Boolean()
+    inherit_cache = False
+    _is_implicitly_boolean = True
+
+    def __init__(self, column, prefix):
+        self.column = column
+        self.prefix = prefix
+
+
+@compiles(PrefixMatch)
+def compile_prefix_match(element, compiler, **kw):
+    clause = func.lower(element.column).like(like_escape(element.prefix) + '%', escape='\\')
+    return compiler.process(clause, **kw)
+
+
+@compiles(PrefixMatch, 'sqlite')
+def compile_prefix_match_sqlite(element, compiler, **kw):
+    # SQLite only optimizes LIKE on plain columns; a range under the BINARY collation is exact
+    lower = func.lower(element.column)
+    clause = and_(lower >= element.prefix, lower < prefix_upper_bound(element.prefix))
+    return compiler.process(clause.self_group(), **kw)
+
+
+def prefix_clause(column, prefix):
+    """Case-insensitive `column` starts with `prefix`; served by an index on lower(column)."""
+    return PrefixMatch(column, prefix.lower())
+
+
+def filter_clause(column, op, value):
+    """SQL criterion of one saved filter; a value that does not fit the column matches no row."""
+    op = effective_operator(column, op)
+    if value is None or not str(value).strip():
+        return None
+
+    try:
+        if op == 'contains':
+            return column.like(f'%{value}%')
+
+        if op == 'prefix':
+            prefix = coerce_value(column, value)
+            if not prefix:
+                return None
+            return prefix_clause(column, prefix)
+
+        if op == 'in':
+            values = [coerce_value(column, item) for item in value.split(',') if item.strip()]
+            return column.in_(values) if values else None
+
+        if op == 'range':
+            lower, _, upper = value.partition('..')
+            if not _:
+                return column == coerce_value(column, value)
+            criteria = []
+            if lower.strip():
+                criteria.append(column >= coerce_value(column, lower))
+            if upper.strip():
+                criteria.append(column <= coerce_value(column, upper))
+            return and_(*criteria) if criteria else None
+
+        return column == coerce_value(column, value)
+
+    except ValueError:
+        return false()
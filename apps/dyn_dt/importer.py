@@ -0,0 +1,192 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import csv, time
+from collections import namedtuple
+from itertools import groupby
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from apps.dyn_dt.filters import column_kind, coerce_value
+
+# Bulk CSV import: the file is parsed as a stream (the header names the
+# columns, the shape written by the CSV export), values are coerced from the
+# column types and rows are inserted batch by batch with executemany.
+
+ImportResult = namedtuple('ImportResult', ['rows', 'inserted', 'skipped', 'errors', 'seconds'])
+
+
+class ImportAborted(Exception):
+    """The database rejected a batch: rows up to `committed` stay imported, `line` is the rejected CSV line."""
+
+    def __init__(self, message, line, committed):
+        super().__init__(message)
+        self.line = line
+        self.committed = committed
+
+    def as_dict(self):
+        return {'error': str(self), 'line': self.line, 'committed': self.committed}
+
+
+class ByteCounter(object):
+    """Decodes binary CSV lines and counts the bytes read, for progress reporting."""
+
+    def __init__(self, binary, encoding='utf-8-sig'):
+        self.binary = binary
+        self.encoding = encoding
+        self.bytes_read = 0
+
+    def __iter__(self):
+        encoding = self.encoding
+        for raw in self.binary:
+            self.bytes_read += len(raw)
+            yield raw.decode(encoding)
+            # the BOM can only lead the first line
+            encoding = 'utf-8'
+
+
+def import_columns(aModelClass, header, keep_ids=False):
+    """(position, column) pairs of the CSV header; raises ValueError for unknown columns."""
+    columns = aModelClass.__table__.columns
+    names = [name.strip() for name in header]
+
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError('Unknown columns: ' + ', '.join(unknown))
+
+    return [(position, columns[name]) for position, name in enumerate(names) if keep_ids or name != 'id']
+
+
+def coerce_row(columns, values):
+    """Column name -> value of one CSV row; raises ValueError naming the offending column."""
+    row = {}
+    for position, column in columns:
+        value = values[position] if position < len(values) else ''
+
+        if value == '':
+            # empty cells fall back to the column default, then NULL
+            if column.default is not None or column.server_default is not None:
+                continue
+            if column.nullable:
+                row[column.name] = None
+                continue
+            if column_kind(column) in ('string', 'text'):
+                row[column.name] = ''
+                continue
+            raise ValueError(f'{column.name}: value required')
+
+        try:
+            row[column.name] = coerce_value(column, value)
+        except ValueError:
+            raise ValueError(f'{column.name}: invalid value {value!r}')
+
+    return row
+
+
+def insert_batch(session, table, rows):
+    # rows relying on different defaults do not share an INSERT statement
+    for _, group in groupby(rows, key=lambda row: tuple(row)):
+        session.execute(insert(table), list(group))
+
+
+def rejected_line(session, table, rows, lines):
+    """(line, error) of the first row the database rejects, inserted one by one; rolled back."""
+    try:
+        for row, line in zip(rows, lines):
+            try:
+                session.execute(insert(table), [row])
+            except SQLAlchemyError as e:
+                return line, e
+        return (lines[0] if lines else None), None
+    finally:
+        session.rollback()
+
+
+def import_csv(session, aModelClass, binary, batch_size=1000, commit_every=10, keep_ids=False,
+               max_errors=100, progress=None, commit=True):
+    """
+    Imports the CSV lines of `binary` (an iterable of bytes) into the model table.
+    Invalid rows are skipped, the first `max_errors` are reported as (line, message).
+    A batch the database rejects rolls back the uncommitted batches and raises ImportAborted.
+    With commit=False nothing is committed and the caller decides (the benchmark rolls back).
+    """
+    ts_start = time.perf_counter()
+    table = aModelClass.__table__
+
+    lines = ByteCounter(binary)
+    reader = csv.reader(lines)
+
+    header = next(reader, None)
+    if not header:
+        return ImportResult(0, 0, 0, [], 0.0)
+    columns = import_columns(aModelClass, header, keep_ids)
+
+    rows = inserted = committed = skipped = batches = 0
+    errors = []
+    batch, batch_lines = [], []
+
+    def write(batch, batch_lines, commit_now):
+        nonlocal committed
+        try:
+            insert_batch(session, table, batch)
+            if commit_now:
+                session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            line, error = rejected_line(session, table, batch, batch_lines)
+            message = str(getattr(error or e, 'orig', None) or error or e).splitlines()[0]
+            raise ImportAborted(message, line, committed)
+        if commit_now:
+            committed = inserted + len(batch)
+
+    for values in reader:
+        if not any(values):
+            continue
+        rows += 1
+
+        try:
+            batch.append(coerce_row(columns, values))
+            batch_lines.append(reader.line_num)
+        except ValueError as e:
+            skipped += 1
+            if len(errors) < max_errors:
+                errors.append((reader.line_num, str(e)))
+
+        if len(batch) >= batch_size:
+            batches += 1
+            write(batch, batch_lines, commit and batches % commit_every == 0)
+            inserted += len(batch)
+            batch, batch_lines = [], []
+
+            if progress:
+                progress(inserted, lines.bytes_read)
+
+    write(batch, batch_lines, commit)
+    inserted += len(batch)
+    if progress:
+        progress(inserted, lines.bytes_read)
+
+    return ImportResult(rows, inserted, skipped, errors, time.perf_counter() - ts_start)
+
+
+def sample_csv(aModelClass, rows, file):
+    """Writes `rows` synthetic rows for the model, used by the import benchmark."""
+    columns = [
+        column for column in aModelClass.__table__.columns
+        if not column.primary_key and not column.foreign_keys
+    ]
+    samples = {
+        'number'  : lambda column, i: str(i % 1000),
+        'datetime': lambda column, i: '2024-01-01 00:00:00',
+        'date'    : lambda column, i: '2024-01-01',
+        'boolean' : lambda column, i: 'true' if i % 2 else 'false',
+        'enum'    : lambda column, i: column.type.enums[i % len(column.type.enums)],
+        'string'  : lambda column, i: f'{column.name}-{i}'[:column.type.length or 32],
+        'text'    : lambda column, i: f'{column.name} {i} lorem ipsum',
+    }
+
+    writer = csv.writer(file)
+    writer.writerow([column.name for column in columns])
+    for i in range(rows):
+        writer.writerow([samples[column_kind(column)](column, i) for column in columns])
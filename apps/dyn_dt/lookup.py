@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import time, threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import String, text
+from apps import db
+from apps.dyn_dt.filters import prefix_clause
+from apps.dyn_dt.pagination import KeysetPagination
+
+# Typeahead lookup of FK options: a page of (id, label) pairs of the related
+# model, prefix-searched on its label column and walked with keyset cursors,
+# instead of loading the whole related table for every dropdown. The prefix
+# search is case-insensitive, setup_lookup_indexes() adds the lower(label)
+# index it needs on SQLite and PostgreSQL.
+
+LABEL_COLUMNS = ('name', 'title', 'username', 'email', 'label', 'code')
+
+
+def label_column(aModelClass):
+    """Column searched and sorted by the lookup: a conventional name first, else the first string column."""
+    columns = aModelClass.__table__.columns
+    for name in LABEL_COLUMNS:
+        if name in columns and isinstance(columns[name].type, String):
+            return columns[name]
+    for column in columns:
+        if isinstance(column.type, String) and not column.primary_key:
+            return column
+    return columns['id']
+
+
+def lookup_index(table, column):
+    return f'ix_{table.name}_lower_{column.name}'
+
+
+def setup_lookup_indexes(models):
+    """Creates (once) the lower(label) index of the given related model classes; needs an app context."""
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        return []
+
+    # LIKE 'v%' only uses a PostgreSQL index outside the C locale with text_pattern_ops
+    ops = ' text_pattern_ops' if dialect == 'postgresql' else ''
+
+    indexed = []
+    with db.engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for aModelClass in models:
+            table = aModelClass.__table__
+            column = label_column(aModelClass)
+            if column.name == 'id':
+                continue
+
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {lookup_index(table, column)} "
+                f"ON {preparer.format_table(table)} (lower({preparer.quote(column.name)}){ops})"
+            ))
+            indexed.append(table.name)
+
+    return indexed
+
+
+def lookup_options(aModelClass, q=None, after=None, limit=20):
+    column = label_column(aModelClass)
+    query = aModelClass.query
+
+    q = (q or '').strip()
+    if q:
+        if q.isdigit():
+            query = query.filter(aModelClass.id == int(q))
+        elif column.name != 'id':
+            query = query.filter(prefix_clause(column, q))
+
+    pagination = KeysetPagination(query, aModelClass, column.name, limit, after=after)
+    return {
+        'results': [{'id': item.id, 'label': str(item)} for item in pagination.items],
+        'next': pagination.next_cursor,
+    }
+
+
+class LookupCache(object):
+    """Recent lookup pages, kept per related model so a write to the model drops only its entries."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, aModelClass, q=None, after=None, limit=20):
+        key = ((q or '').strip(), after, limit)
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._models.get(aModelClass)
+            if entries and key in entries and entries[key][1] > now:
+                entries.move_to_end(key)
+                return entries[key][0]
+
+        options = lookup_options(aModelClass, q, after, limit)
+        ttl = current_app.config.get('DYNAMIC_DATATB_LOOKUP_TTL', 60)
+
+        with self._lock:
+            entries = self._models.setdefault(aModelClass, OrderedDict())
+            entries[key] = (options, now + ttl)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return options
+
+    def invalidate(self, aModelClass):
+        with self._lock:
+            self._models.pop(aModelClass, None)
+
+
+lookup_cache = LookupCache()
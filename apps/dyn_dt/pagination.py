@@ -0,0 +1,130 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import json, base64, binascii
+from datetime import datetime, date
+from enum import Enum
+from sqlalchemy import and_, or_, tuple_, literal
+from sqlalchemy import DateTime, Date
+
+# Keyset (seek) pagination: rows are ordered by (order_by, id) and a page is
+# addressed by the key of its boundary row, so page N costs the same as page 1.
+# That holds with a composite index on (order_by, id): an index on order_by
+# alone still sorts the ties on id for every page. NULLs of nullable columns
+# sort first on every engine.
+
+def encode_cursor(order_by, value, id):
+    if isinstance(value, Enum):
+        value = value.name
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+
+    payload = json.dumps({'k': order_by, 'v': value, 'id': id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, column):
+    """Returns the (value, id) boundary stored in the token or None when the token is invalid."""
+    if not token:
+        return None
+
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, id = payload['v'], int(payload['id'])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+
+    if payload.get('k') != column.name:
+        return None
+
+    if value is not None:
+        try:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+            elif getattr(column.type, 'enum_class', None):
+                value = column.type.enum_class[value]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    return value, id
+
+
+def keyset_condition(column, id_column, value, id, forward=True):
+    """Rows strictly after (forward) or before the (value, id) boundary."""
+    if column is id_column:
+        return id_column > id if forward else id_column < id
+
+    if not column.nullable and value is not None:
+        # a row-value comparison, a single range scan of the (column, id) index
+        boundary = tuple_(literal(value, column.type), literal(id, id_column.type))
+        if forward:
+            return tuple_(column, id_column) > boundary
+        return tuple_(column, id_column) < boundary
+
+    # nullable columns: NULLs sort first, a NULL never compares in a row value
+    if forward:
+        if value is None:
+            return or_(column.isnot(None), and_(column.is_(None), id_column > id))
+        return or_(column > value, and_(column == value, id_column > id))
+
+    if value is None:
+        return and_(column.is_(None), id_column < id)
+    return or_(column.is_(None), column < value, and_(column == value, id_column < id))
+
+
+def keyset_order(column, id_column, forward=True):
+    if column is id_column:
+        return (id_column.asc(),) if forward else (id_column.desc(),)
+
+    # NOT NULL columns keep the default ordering an index on (column, id) serves as is
+    if not column.nullable:
+        return (column.asc(), id_column.asc()) if forward else (column.desc(), id_column.desc())
+
+    if forward:
+        return (column.asc().nulls_first(), id_column.asc())
+    return (column.desc().nulls_last(), id_column.desc())
+
+
+class KeysetPagination(object):
+
+    def __init__(self, query, aModelClass, order_by, per_page, after=None, before=None, descending=False):
+        self.per_page = per_page
+        self.order_by = order_by
+
+        column = aModelClass.__table__.columns[order_by]
+        id_column = aModelClass.__table__.columns['id']
+
+        boundary = decode_cursor(before, column)
+        forward = boundary is None
+        if forward:
+            boundary = decode_cursor(after, column)
+
+        # a descending listing walks the (order_by, id) key backwards
+        ascending = forward != descending
+
+        if boundary is not None:
+            query = query.filter(keyset_condition(column, id_column, *boundary, forward=ascending))
+
+        rows = query.order_by(None).order_by(*keyset_order(column, id_column, ascending)).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if forward:
+            self.has_prev = boundary is not None
+            self.has_next = has_more
+        else:
+            rows.reverse()
+            self.has_prev = has_more
+            self.has_next = True
+
+        self.items = rows
+        self.next_cursor = self._cursor(rows[-1]) if self.has_next and rows else None
+        self.prev_cursor = self._cursor(rows[0]) if self.has_prev and rows else None
+
+    def _cursor(self, item):
+        return encode_cursor(self.order_by, getattr(item, self.order_by), item.id)
@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import time, threading
+from collections import namedtuple
+from types import MappingProxyType
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, literal, case, union_all, Integer, String
+from apps import db
+from apps.dyn_dt.utils import HideShowFilter, ModelFilter, PageItems
+
+FilterPref   = namedtuple('FilterPref', ['id', 'key', 'value', 'op'], defaults=(None,))
+HideShowPref = namedtuple('HideShowPref', ['key', 'value'])
+Preferences  = namedtuple('Preferences', ['hidden', 'filters', 'items_per_page'])
+
+
+class PreferenceStore(object):
+    """
+    HideShowFilter / ModelFilter / PageItems rows of a model, loaded in a single
+    round trip and cached in-process. Every write goes through the store so the
+    cached snapshot is invalidated; the TTL bounds staleness across workers.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, parent):
+        now = time.monotonic()
+        cached = self._cache.get(parent)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        prefs = self.load(parent)
+        with self._lock:
+            self._cache[parent] = (prefs, now + current_app.config.get('DYNAMIC_DATATB_PREFS_TTL', 60))
+        return prefs
+
+    def invalidate(self, parent):
+        with self._lock:
+            self._cache.pop(parent, None)
+
+    def load(self, parent):
+        hide_show = select(
+            literal('hide_show').label('kind'), HideShowFilter.id, HideShowFilter.key,
+            literal(None, String).label('text_value'),
+            case((HideShowFilter.value == True, 1), else_=0).label('int_value'),
+            literal(None, String).label('op'),
+        ).where(HideShowFilter.parent == parent)
+
+        filters = select(
+            literal('filter'), ModelFilter.id, ModelFilter.key,
+            ModelFilter.value, literal(None, Integer), ModelFilter.op,
+        ).where(ModelFilter.parent == parent)
+
+        page_items = select(
+            literal('page_items'), PageItems.id, literal(None, String),
+            literal(None, String), PageItems.items_per_page, literal(None, String),
+        ).where(PageItems.parent == parent)
+
+        rows = db.session.execute(union_all(hide_show, filters, page_items)).all()
+
+        hidden = {}
+        filter_prefs = []
+        items_per_page = None
+        page_items_id = None
+        for kind, id, key, text_value, int_value, op in sorted(rows, key=lambda row: (row[0], row[1])):
+            if kind == 'hide_show':
+                hidden[key] = bool(int_value)
+            elif kind == 'filter':
+                filter_prefs.append(FilterPref(id, key, text_value, op))
+            elif page_items_id is None or id > page_items_id:
+                page_items_id, items_per_page = id, int_value
+
+        return Preferences(MappingProxyType(hidden), tuple(filter_prefs), items_per_page)
+
+    # Writes
+
+    def set_filters(self, parent, rows):
+        """Saves (key, value, op) rows, one filter per key."""
+        values = {key: (value, op) for key, value, op in rows}
+        existing = {f.key: f.id for f in self.load(parent).filters if f.key in values}
+
+        updates = []
+        for key, id in existing.items():
+            value, op = values.pop(key)
+            updates.append({'id': id, 'value': value, 'op': op})
+
+        if updates:
+            db.session.execute(update(ModelFilter), updates)
+        if values:
+            db.session.execute(insert(ModelFilter), [
+                {'parent': parent, 'key': key, 'value': value, 'op': op} for key, (value, op) in values.items()
+            ])
+        self._commit(parent)
+
+    def set_hide_show(self, parent, key, value):
+        self._upsert(HideShowFilter, parent, {'value': bool(value)}, HideShowFilter.key == key, key=key)
+
+    def set_page_items(self, parent, items_per_page):
+        self._upsert(PageItems, parent, {'items_per_page': items_per_page})
+
+    def delete_filter(self, parent, id):
+        result = db.session.execute(
+            delete(ModelFilter).where(ModelFilter.id == id, ModelFilter.parent == parent)
+        )
+        self._commit(parent)
+        return result.rowcount
+
+    def _upsert(self, model, parent, values, *criteria, **keys):
+        result = db.session.execute(
+            update(model).where(model.parent == parent, *criteria).values(**values)
+        )
+        if not result.rowcount:
+            db.session.execute(insert(model).values(parent=parent, **keys, **values))
+        self._commit(parent)
+
+    def _commit(self, parent):
+        try:
+            db.session.commit()
+        finally:
+            self.invalidate(parent)
+
+
+preference_store = PreferenceStore()
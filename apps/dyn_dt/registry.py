@@ -0,0 +1,116 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from flask import current_app
+from sqlalchemy import Integer, DateTime, Text
+from sqlalchemy.orm import configure_mappers
+from apps import db
+from apps.dyn_dt.filters import OPERATORS, column_operators, unset_operator
+from apps.dyn_dt.usage import usage_log
+from apps.dyn_dt.utils import get_model_field_names, get_model_fk_relations, name_to_class, exclude_auto_gen_fields
+
+
+@dataclass(frozen=True)
+class ModelMeta:
+    """Schema metadata of a DYNAMIC_DATATB model, computed once and shared by all requests."""
+    path: str
+    class_name: str
+    model: type
+    db_fields: tuple            # columns without foreign keys
+    all_fields: tuple           # every column of the table
+    db_filters: tuple
+    filter_operators: MappingProxyType   # filter field -> {'default': op, 'unset': op, 'allowed': ((op, label), ...)}
+    fk_relations: MappingProxyType
+    choices_dict: MappingProxyType
+    integer_fields: tuple
+    date_time_fields: tuple
+    text_fields: tuple
+    exclude_auto_gen_fields: tuple
+    build_ms: float
+
+
+def build_model_meta(path, class_name):
+    ts_start = time.perf_counter()
+
+    aModelClass = name_to_class(class_name)
+    if not aModelClass:
+        return None
+
+    columns = aModelClass.__table__.columns
+    db_fields = tuple(column.name for column in columns if not column.foreign_keys)
+    fk_relations = get_model_fk_relations(aModelClass)
+
+    filter_operators = {}
+    for field in db_fields:
+        default, allowed = column_operators(columns[field])
+        filter_operators[field] = {
+            'default': default,
+            'unset'  : unset_operator(columns[field]),
+            'allowed': tuple((op, OPERATORS[op]) for op in allowed),
+        }
+
+    choices_dict = {}
+    for column in columns:
+        if isinstance(column.type, db.Enum) and column.type.enum_class:
+            choices_dict[column.name] = tuple((choice.name, choice.value) for choice in column.type.enum_class)
+
+    return ModelMeta(
+        path=path,
+        class_name=class_name,
+        model=aModelClass,
+        db_fields=db_fields,
+        all_fields=tuple(column.name for column in columns),
+        db_filters=tuple(field for field in db_fields if field not in fk_relations),
+        filter_operators=MappingProxyType(filter_operators),
+        fk_relations=MappingProxyType(fk_relations),
+        choices_dict=MappingProxyType(choices_dict),
+        integer_fields=tuple(get_model_field_names(aModelClass, Integer)),
+        date_time_fields=tuple(get_model_field_names(aModelClass, DateTime)),
+        text_fields=tuple(get_model_field_names(aModelClass, Text)),
+        exclude_auto_gen_fields=tuple(exclude_auto_gen_fields(aModelClass)),
+        build_ms=(time.perf_counter() - ts_start) * 1000,
+    )
+
+
+class ModelRegistry(object):
+
+    def __init__(self, datatables):
+        ts_start = time.perf_counter()
+
+        configure_mappers()
+
+        models = {}
+        for path, class_name in datatables.items():
+            meta = build_model_meta(path, class_name)
+            if meta:
+                models[path] = meta
+
+        self.models = MappingProxyType(models)
+        self.build_ms = (time.perf_counter() - ts_start) * 1000
+
+    def get(self, path):
+        return self.models.get(path)
+
+    def timings(self):
+        return {path: round(meta.build_ms, 3) for path, meta in self.models.items()}
+
+
+def init_registry(app):
+    registry = ModelRegistry(app.config.get('DYNAMIC_DATATB', {}))
+    app.extensions['dyn_dt_registry'] = registry
+    usage_log.init_app(app)
+
+    print(' > DYNAMIC_DATATB:   {} models in {:.2f} ms'.format(len(registry.models), registry.build_ms))
+    for path, build_ms in registry.timings().items():
+        app.logger.debug('DYNAMIC_DATATB {} built in {} ms'.format(path, build_ms))
+
+    return registry
+
+
+def get_model_meta(path):
+    return current_app.extensions['dyn_dt_registry'].get(path)
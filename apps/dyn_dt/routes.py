@@ -1,12 +1,25 @@
-import json, csv, io
-from flask_login import login_required
+import os, json, uuid
+from flask_login import login_required, current_user
 from apps.dyn_dt import blueprint
-from flask import render_template, request, redirect, url_for, jsonify, make_response
-from apps.dyn_dt.utils import get_model_field_names, get_model_fk_values, name_to_class, user_filter, exclude_auto_gen_fields
+from flask import render_template, request, redirect, url_for, jsonify, make_response, Response, stream_with_context, send_from_directory
+from apps.dyn_dt.utils import model_filter_clauses, user_filter
+from apps.dyn_dt.search import fulltext_backend
+from apps.dyn_dt.filters import OPERATORS, effective_operator
 from apps import db, config
 from apps.dyn_dt.utils import *
-from sqlalchemy import and_
-from sqlalchemy import Integer, DateTime, String, Text
+from apps.dyn_dt.pagination import KeysetPagination
+from apps.dyn_dt.api import parse_data_request, row_dict, form_value
+from apps.dyn_dt.registry import get_model_meta
+from apps.dyn_dt.preferences import preference_store, HideShowPref
+from apps.dyn_dt.usage import usage_log
+from apps.dyn_dt.lookup import lookup_cache
+from apps.dyn_dt.counting import CountedPagination, count_rows, count_strategy, count_cache
+from apps.cache import table_watermark, make_etag, user_key, not_modified, add_validators
+from apps.dyn_dt.export import ExportSpec, iter_serial_csv, iter_parallel_csv, iter_gzip, partition_bounds
+from apps.dyn_dt.export import spec_to_json, artifact_name, fresh_artifact, claim_export_job, release_export_job
+from apps.dyn_dt.importer import import_csv, ImportAborted
+from apps.dyn_dt.bulk import parse_ids, bulk_delete, bulk_update, column_value
+from apps.tasks import celery_app, export_csv_job, import_csv_job
 from datetime import datetime
 
 @blueprint.route('/dynamic-dt')
@@ -24,16 +37,10 @@ def create_filter(model_name):
     if request.method == "POST":
         keys = request.form.getlist('key')
         values = request.form.getlist('value')
-        
-        for key, value in zip(keys, values):
-            filter_instance = ModelFilter.query.filter_by(parent=model_name, key=key).first()
-            if filter_instance:
-                filter_instance.value = value
-            else:
-                filter_instance = ModelFilter(parent=model_name, key=key, value=value)
-            db.session.add(filter_instance)
-        
-        db.session.commit()
+        ops = [op if op in OPERATORS else None for op in request.form.getlist('op')]
+        ops += [None] * (len(keys) - len(ops))
+
+        preference_store.set_filters(model_name, zip(keys, values, ops))
         return redirect(url_for('table_blueprint.model_dt', aPath=model_name))
 
 
@@ -41,14 +48,8 @@ def create_filter(model_name):
 def create_page_items(model_name):
     model_name = model_name.lower()
     if request.method == 'POST':
-        items = request.form.get('items')
-        page_items = PageItems.query.filter_by(parent=model_name).first()
-        if page_items:
-            page_items.items_per_page = items
-        else:
-            page_items = PageItems(parent=model_name, items_per_page=items)
-        db.session.add(page_items)
-        db.session.commit()
+        items = request.form.get('items', type=int)
+        preference_store.set_page_items(model_name, items)
         return redirect(url_for('table_blueprint.model_dt', aPath=model_name))
 
 
@@ -59,14 +60,7 @@ def create_hide_show_filter(model_name):
         data_str = list(request.form.keys())[0]
         data = json.loads(data_str)
 
-        filter_instance = HideShowFilter.query.filter_by(parent=model_name, key=data.get('key')).first()
-        if filter_instance:
-            filter_instance.value = data.get('value')
-        else:
-            filter_instance = HideShowFilter(parent=model_name, key=data.get('key'), value=data.get('value'))
-        
-        db.session.add(filter_instance)
-        db.session.commit()
+        preference_store.set_hide_show(model_name, data.get('key'), data.get('value'))
 
         return jsonify({'message': 'Model updated successfully'})
 
@@ -74,79 +68,67 @@ def create_hide_show_filter(model_name):
 @blueprint.route('/delete_filter/<model_name>/<int:id>', methods=["GET"])
 def delete_filter(model_name, id):
     model_name = model_name.lower()
-    filter_instance = ModelFilter.query.filter_by(id=id, parent=model_name).first()
-    if filter_instance:
-        db.session.delete(filter_instance)
-        db.session.commit()
+    if preference_store.delete_filter(model_name, id):
         return redirect(url_for('table_blueprint.model_dt', aPath=model_name))
     return jsonify({'error': 'Filter not found'}), 404
 
 
 @blueprint.route('/dynamic-dt/<aPath>', methods=['GET', 'POST'])
 def model_dt(aPath):
-    aModelName = None
-    aModelClass = None
+    meta = get_model_meta(aPath)
+    if not meta:
+        return f'ERR: Getting ModelClass for path: {aPath}', 404
 
-    if aPath in config.Config.DYNAMIC_DATATB.keys():
-        aModelName = config.Config.DYNAMIC_DATATB[aPath]
-        aModelClass = name_to_class(aModelName)
+    aModelClass = meta.model
+    db_fields = meta.db_fields
+    fk_fields_keys = tuple(meta.fk_relations)
 
-    if not aModelClass:
-        return f'ERR: Getting ModelClass for path: {aPath}', 404
+    prefs = preference_store.get(aPath.lower())
+
+    # Same table data, preferences, user and URL: the client copy is current
+    etag = make_etag('model_dt', request.full_path, request.headers.get('X-Fragment'),
+                     prefs_key(prefs), user_key(), table_watermark(aModelClass))
+    response = not_modified(etag)
+    if response:
+        return response
+
+    field_names = [HideShowPref(field_name, prefs.hidden.get(field_name, False)) for field_name in db_fields]
 
-    # db_fields = [field.name for field in aModelClass.__table__.columns]
-    db_fields = [field.name for field in aModelClass.__table__.columns if not field.foreign_keys]
-    fk_fields = get_model_fk_values(aModelClass)
-    db_filters = []
-    for f in db_fields:
-        if f not in fk_fields.keys():
-            db_filters.append( f )
-
-    choices_dict = {}
-    for column in aModelClass.__table__.columns:
-        if isinstance(column.type, db.Enum):
-            choices_dict[column.name] = [(choice.name, choice.value) for choice in column.type.enum_class]
-
-    field_names = []
-    for field_name in db_fields:
-        field = HideShowFilter.query.filter_by(parent=aPath.lower(), key=field_name).first()
-        if field:
-            field_names.append(field)
-        else:
-            field = HideShowFilter(parent=aPath.lower(), key=field_name)
-            db.session.add(field)
-            db.session.commit()
-
-            field_names.append(field)
-
-    filter_string = []
-    filter_instance = ModelFilter.query.filter_by(parent=aPath.lower()).all()
-    for filter_data in filter_instance:
-        if filter_data.key in db_fields:
-            filter_string.append(getattr(aModelClass, filter_data.key).like(f"%{filter_data.value}%"))
+    filter_instance = prefs.filters
+    filter_string = model_filter_clauses(aModelClass, filter_instance, db_fields)
 
     order_by = request.args.get('order_by', 'id')
     if order_by not in db_fields:
         order_by = 'id'
 
-    queryset = aModelClass.query.filter(and_(*filter_string)).order_by(order_by)
+    queryset = aModelClass.query.filter(*filter_string)
 
     # Pagination
-    page_items = PageItems.query.filter_by(parent=aPath.lower()).order_by(PageItems.id.desc()).first()
-    p_items = 25
-    if page_items:
-        p_items = page_items.items_per_page
-
-    page = request.args.get('page', 1, type=int)
-    queryset = user_filter(request, queryset, db_fields, fk_fields.keys())
-    pagination = queryset.paginate(page=page, per_page=p_items, error_out=False)
+    p_items = prefs.items_per_page or 25
+
+    queryset = user_filter(request, queryset, db_fields, fk_fields_keys)
+
+    usage_log.record(aPath, filter_usage(meta, filter_instance), order_by, request.args.get('search'))
+
+    next_url = prev_url = None
+    pagination_mode = config.Config.DYNAMIC_DATATB_PAGINATION.get(aPath, 'page')
+    if pagination_mode == 'keyset':
+        pagination = KeysetPagination(queryset, aModelClass, order_by, p_items,
+                                      after=request.args.get('after'), before=request.args.get('before'))
+        if pagination.has_next:
+            next_url = cursor_url(aPath, after=pagination.next_cursor)
+        if pagination.has_prev:
+            prev_url = cursor_url(aPath, before=pagination.prev_cursor)
+    else:
+        page = request.args.get('page', 1, type=int)
+        search = request.args.get('search') or ''
+        pagination = CountedPagination(queryset.order_by(order_by), aModelClass, count_strategy(aPath),
+                                       state=(filter_state(filter_instance), search), filtered=bool(filter_string or search),
+                                       page=page, per_page=p_items, max_per_page=None, error_out=False)
     items = pagination.items
 
     # Read-only and field types
     read_only_fields = ('id', 'user_id', 'date_created', 'date_modified', )
-    integer_fields = get_model_field_names(aModelClass, Integer)
-    date_time_fields = get_model_field_names(aModelClass, DateTime)
-    text_fields = get_model_field_names(aModelClass, Text)
     email_fields = []
 
     # Context
@@ -155,56 +137,187 @@ def model_dt(aPath):
         'link': aPath,
         'field_names': field_names,
         'db_field_names': db_fields,
-        'db_filters': db_filters,
+        'db_filters': meta.db_filters,
+        'filter_operators': dict(meta.filter_operators),
         'items': items,
         'pagination': pagination,
+        'pagination_mode': pagination_mode,
+        'next_url': next_url,
+        'prev_url': prev_url,
         'page_items': p_items,
         'filter_instance': filter_instance,
         'read_only_fields': read_only_fields,
-        'integer_fields': integer_fields,
-        'date_time_fields': date_time_fields,
+        'integer_fields': meta.integer_fields,
+        'date_time_fields': meta.date_time_fields,
         'email_fields': email_fields,
-        'text_fields': text_fields,
-        'fk_fields_keys': fk_fields.keys(),
-        'fk_fields': fk_fields,
+        'text_fields': meta.text_fields,
+        'fk_fields_keys': fk_fields_keys,
         'segment': 'dynamic_dt',
         'parent': 'dashboard',
-        'choices_dict': choices_dict,
-        'exclude_auto_gen_fields': exclude_auto_gen_fields(aModelClass)
+        'choices_dict': meta.choices_dict,
+        'exclude_auto_gen_fields': meta.exclude_auto_gen_fields
     }
-    return render_template('dyn_dt/model.html', **context)
 
+    # Paging / searching from the page only swaps the table in place
+    if request.headers.get('X-Fragment') == 'table':
+        response = make_response(render_template('dyn_dt/table.html', **context))
+    else:
+        response = make_response(render_template('dyn_dt/model.html', **context))
+    response.vary.add('X-Fragment')
+    return add_validators(response, etag)
 
-@blueprint.route('/create/<aPath>', methods=["POST"])
+
+def prefs_key(prefs):
+    """Hashable form of the datatable preferences, part of the ETag."""
+    return (tuple(sorted(prefs.hidden.items())), prefs.filters, prefs.items_per_page)
+
+
+def filter_state(filters):
+    """Hashable form of the saved filters, part of the row count cache key."""
+    return tuple(sorted((f.key, f.op or '', f.value) for f in filters))
+
+
+def filter_usage(meta, filters):
+    """(column, operator) pairs of the applied saved filters, as recorded in the usage log."""
+    columns = meta.model.__table__.columns
+    return [(f.key, effective_operator(columns[f.key], f.op)) for f in filters if f.key in meta.db_fields and f.value]
+
+
+def cursor_url(aPath, **cursor):
+    args = {key: value for key, value in request.args.items() if key not in ('page', 'after', 'before')}
+    args.update(cursor)
+    return url_for('table_blueprint.model_dt', aPath=aPath, **args)
+
+
+@blueprint.route('/dynamic-dt/<aPath>/data', methods=['GET'])
+def model_data(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 404
+
+    aModelClass = meta.model
+    prefs = preference_store.get(aPath.lower())
+
+    etag = make_etag('model_data', request.full_path, prefs.filters, prefs.items_per_page, table_watermark(aModelClass))
+    response = not_modified(etag)
+    if response:
+        return response
+
+    data_request = parse_data_request(request.args, meta.all_fields, prefs.items_per_page or 25)
+
+    strategy = count_strategy(aPath)
+    filter_clauses = model_filter_clauses(aModelClass, prefs.filters, meta.db_fields)
+    queryset = aModelClass.query.filter(*filter_clauses)
+    records_total, estimated = count_rows(queryset, aModelClass, strategy,
+                                          (filter_state(prefs.filters), ''), bool(filter_clauses))
+
+    if data_request.search:
+        queryset = queryset.filter(search_criteria(
+            aModelClass, data_request.search, meta.db_fields, meta.fk_relations.keys(),
+            fulltext_backend(aModelClass, data_request.search)
+        ))
+        records_filtered, _ = count_rows(queryset, aModelClass, strategy,
+                                         (filter_state(prefs.filters), data_request.search))
+    else:
+        records_filtered = records_total
+
+    usage_log.record(aPath, filter_usage(meta, prefs.filters), data_request.order_by, data_request.search)
+
+    response = {'draw': data_request.draw, 'recordsTotal': records_total, 'recordsFiltered': records_filtered,
+                'estimated': estimated}
+
+    if data_request.after or data_request.before or config.Config.DYNAMIC_DATATB_PAGINATION.get(aPath) == 'keyset' and 'start' not in request.args:
+        pagination = KeysetPagination(queryset, aModelClass, data_request.order_by, data_request.length,
+                                      after=data_request.after, before=data_request.before, descending=data_request.descending)
+        response['next'] = pagination.next_cursor
+        response['prev'] = pagination.prev_cursor
+        items = pagination.items
+    else:
+        column = getattr(aModelClass, data_request.order_by)
+        order = (column.desc(), aModelClass.id.desc()) if data_request.descending else (column.asc(), aModelClass.id.asc())
+        items = queryset.order_by(*order).offset(data_request.start).limit(data_request.length).all()
+
+    response['columns'] = data_request.columns
+    response['data'] = [row_dict(item, data_request.columns) for item in items]
+    return add_validators(jsonify(response), etag)
+
+
+@blueprint.route('/dynamic-dt/<aPath>/row/<int:id>', methods=['GET'])
+def model_row(aPath, id):
+    """One row for the shared view / edit modal, plus its FK labels when editing is allowed."""
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 404
+
+    etag = make_etag('model_row', aPath, id, user_key(), table_watermark(meta.model))
+    response = not_modified(etag)
+    if response:
+        return response
+
+    item = db.session.get(meta.model, id)
+    if not item:
+        return jsonify({'error': 'Item not found'}), 404
+
+    # only the current FK values, the edit modal searches the others via the lookup endpoint
+    fk_options = {}
+    if current_user.is_authenticated:
+        for field in meta.fk_relations:
+            related = getattr(item, field, None)
+            fk_options[field] = [{'id': related.id, 'label': str(related)}] if related is not None else []
+
+    return add_validators(jsonify({
+        'id': item.id,
+        'values': {field: form_value(getattr(item, field, None)) for field in meta.all_fields},
+        'fk_options': fk_options,
+    }), etag)
+
+
+@blueprint.route('/dynamic-dt/<aPath>/lookup/<field>', methods=['GET'])
 @login_required
-def create(aPath):
-    aModelClass = None
+def fk_lookup(aPath, field):
+    meta = get_model_meta(aPath)
+    if not meta or field not in meta.fk_relations:
+        return jsonify({'error': f'ERR: No foreign key {field} for path: {aPath}'}), 404
+
+    related_model = meta.fk_relations[field].model
+    etag = make_etag('fk_lookup', request.full_path, table_watermark(related_model))
+    response = not_modified(etag)
+    if response:
+        return response
 
-    if aPath in config.Config.DYNAMIC_DATATB:
-        aModelName = config.Config.DYNAMIC_DATATB[aPath]
-        aModelClass = name_to_class(aModelName)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return add_validators(jsonify(lookup_cache.get(related_model, request.args.get('q'), request.args.get('after'), limit)), etag)
 
-    if not aModelClass:
+
+@blueprint.route('/create/<aPath>', methods=["POST"])
+@login_required
+def create(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
         return ' > ERR: Getting ModelClass for path: ' + aPath
 
+    aModelClass = meta.model
+
     if request.method == 'POST':
         data = {}
-        fk_fields = get_model_fk_values(aModelClass)
 
         for attribute, value in request.form.items():
-            if attribute in fk_fields.keys():
-                table_name = None
-                for product in fk_fields[attribute]:
-                    table_name = product.__class__.__tablename__
-                if table_name:
-                    model_name = config.Config.DYNAMIC_DATATB[table_name]
-                    value = name_to_class(model_name).query.filter_by(id=value).first()
+            # FKs are set through their column attribute, the related row is never loaded
+            if attribute in meta.fk_relations:
+                relation = meta.fk_relations[attribute]
+                try:
+                    data[relation.attribute] = fk_column_value(aModelClass, relation, value)
+                except ValueError as e:
+                    return str(e), 400
+                continue
 
             data[attribute] = value if value else ''
 
         new_item = aModelClass(**data)
         db.session.add(new_item)
         db.session.commit()
+        lookup_cache.invalidate(aModelClass)
+        count_cache.invalidate(aModelClass)
 
     return redirect(request.referrer) 
 
@@ -212,19 +325,18 @@ def create(aPath):
 @blueprint.route('/delete/<aPath>/<id>', methods=["GET"])
 @login_required
 def delete(aPath, id):
-    aModelClass = None
-
-    if aPath in config.Config.DYNAMIC_DATATB:
-        aModelName = config.Config.DYNAMIC_DATATB[aPath]
-        aModelClass = name_to_class(aModelName)
-
-    if not aModelClass:
+    meta = get_model_meta(aPath)
+    if not meta:
         return ' > ERR: Getting ModelClass for path: ' + aPath
+
+    aModelClass = meta.model
     
     item = aModelClass.query.get(id)
     if item:
         db.session.delete(item)
         db.session.commit()
+        lookup_cache.invalidate(aModelClass)
+        count_cache.invalidate(aModelClass)
 
     return redirect(request.referrer)
 
@@ -232,94 +344,304 @@ def delete(aPath, id):
 @blueprint.route('/update/<aPath>/<int:id>', methods=["POST"])
 @login_required
 def update(aPath, id):
-    aModelClass = None
-
-    if aPath in config.Config.DYNAMIC_DATATB:
-        aModelName = config.Config.DYNAMIC_DATATB[aPath]
-        aModelClass = name_to_class(aModelName)
-
-    if not aModelClass:
+    meta = get_model_meta(aPath)
+    if not meta:
         return ' > ERR: Getting ModelClass for path: ' + aPath
 
+    aModelClass = meta.model
+
     item = aModelClass.query.get(id)
     if not item:
         return 'Item not found', 404
 
-    fk_fields = get_model_fk_values(aModelClass)
-
     if request.method == 'POST':
         for attribute, value in request.form.items():
-            if hasattr(item, attribute) and getattr(item, attribute, value) is not None:
-                if attribute in fk_fields.keys():
-                    table_name = None
-                    for product in fk_fields[attribute]:
-                        table_name = product.__class__.__tablename__
-                    if table_name:
-                        model_name = config.Config.DYNAMIC_DATATB[table_name]
-                        value = name_to_class(model_name).query.filter_by(id=value).first()
-
+            if attribute in meta.fk_relations:
+                relation = meta.fk_relations[attribute]
+                try:
+                    setattr(item, relation.attribute, fk_column_value(aModelClass, relation, value))
+                except ValueError as e:
+                    db.session.rollback()
+                    return str(e), 400
+            elif hasattr(item, attribute) and getattr(item, attribute, value) is not None:
                 setattr(item, attribute, value)
         
         db.session.commit()
+        lookup_cache.invalidate(aModelClass)
+        count_cache.invalidate(aModelClass)
 
     return redirect(request.referrer)
 
 
+def view_criteria(meta, aPath, search=None):
+    """Criteria of the rows the datatable shows: saved filters plus the search box."""
+    criteria = model_filter_clauses(meta.model, preference_store.get(aPath.lower()).filters, meta.db_fields)
+    if search:
+        criteria.append(search_criteria(meta.model, search, meta.db_fields, tuple(meta.fk_relations),
+                                        fulltext_backend(meta.model, search)))
+    return criteria
+
+
+def bulk_target(meta, aPath):
+    """(ids, criteria) of a bulk request: the selected ids, or every row of the current view (scope=filter)."""
+    if request.form.get('scope') == 'filter':
+        criteria = view_criteria(meta, aPath, request.form.get('search') or request.args.get('search'))
+        # an unfiltered view is the whole table, that has to be asked for explicitly
+        if not criteria and request.form.get('all') != '1':
+            raise ValueError('No filter or search applied, this targets every row (all=1)')
+        return None, criteria
+
+    ids = parse_ids(request.form.getlist('ids'))
+    if not ids:
+        raise ValueError('No rows selected')
+    return ids, None
+
+
+@blueprint.route('/bulk/<aPath>/delete', methods=['POST'])
+@login_required
+def bulk_delete_rows(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 404
+
+    try:
+        ids, criteria = bulk_target(meta, aPath)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    affected = bulk_delete(db.session, meta.model, ids, criteria)
+    db.session.commit()
+    lookup_cache.invalidate(meta.model)
+    count_cache.invalidate(meta.model)
+
+    return jsonify({'affected': affected})
+
+
+@blueprint.route('/bulk/<aPath>/update', methods=['POST'])
+@login_required
+def bulk_update_rows(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 404
+
+    column_name = request.form.get('column')
+    if column_name not in meta.all_fields or column_name == 'id':
+        return jsonify({'error': f'Column {column_name} can not be updated'}), 400
+
+    try:
+        value = column_value(meta.model.__table__.columns[column_name], request.form.get('value'))
+        ids, criteria = bulk_target(meta, aPath)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    affected = bulk_update(db.session, meta.model, {column_name: value}, ids, criteria)
+    db.session.commit()
+    lookup_cache.invalidate(meta.model)
+    count_cache.invalidate(meta.model)
+
+    return jsonify({'affected': affected})
+
+
 @blueprint.route('/export/<aPath>', methods=['GET'])
 def export_csv(aPath):
-    aModelName = None
-    aModelClass = None
+    meta = get_model_meta(aPath)
+    if not meta:
+        return ' > ERR: Getting ModelClass for path: ' + aPath, 400
 
-    if aPath in config.Config.DYNAMIC_DATATB:
-        aModelName = config.Config.DYNAMIC_DATATB[aPath]
-        aModelClass = name_to_class(aModelName)
+    aModelClass = meta.model
+    spec = export_spec(meta, aPath)
 
-    if not aModelClass:
-        return ' > ERR: Getting ModelClass for path: ' + aPath, 400
+    gzip = 'gzip' in request.accept_encodings
+    etag = make_etag('export_csv', spec_to_json(spec), gzip, table_watermark(aModelClass))
+    response = not_modified(etag)
+    if response:
+        response.vary.add('Accept-Encoding')
+        return response
+
+    # Stream rows in batches, the ORM never holds more than one batch
+    batch_size = config.Config.DYNAMIC_DATATB_EXPORT_BATCH
+    workers = config.Config.DYNAMIC_DATATB_EXPORT_WORKERS
 
-    db_field_names = [column.name for column in aModelClass.__table__.columns]
-    fk_fields = get_model_fk_values(aModelClass)
+    bounds = []
+    if workers > 1:
+        bounds = partition_bounds(db.session, aModelClass, spec, config.Config.DYNAMIC_DATATB_EXPORT_PARTITION_ROWS)
+    if len(bounds) > 1:
+        chunks = iter_parallel_csv(db.engine.url.render_as_string(hide_password=False), spec, bounds, workers, batch_size,
+                                   inherited=(db.engine,))
+    else:
+        chunks = iter_serial_csv(db.session, aModelClass, spec, batch_size)
 
-    fields = []
-    show_fields = HideShowFilter.query.filter_by(value=False, parent=aPath.lower()).all()
-    for field in show_fields:
-        if field.key in db_field_names:
-            fields.append(field.key)
-        else:
-            print(f"Field {field.key} does not exist in {aModelClass} model.")
+    headers = {'Content-Disposition': f'attachment; filename="{aPath.lower()}.csv"'}
+    if gzip:
+        chunks = iter_gzip(chunks)
+        headers['Content-Encoding'] = 'gzip'
 
+    response = Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
+    response.vary.add('Accept-Encoding')
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(fields)
+    return add_validators(response, etag)
 
-    # Filtering
-    filter_string = {}
-    filter_instance = ModelFilter.query.filter_by(parent=aPath.lower()).all()
-    for filter_data in filter_instance:
-        filter_string[f'{filter_data.key}__icontains'] = filter_data.value
+
+def export_spec(meta, aPath):
+    prefs = preference_store.get(aPath.lower())
+    fields = [field for field in meta.db_fields if not prefs.hidden.get(field, False)]
 
     # Ordering
     order_by = request.args.get('order_by', 'id')
-    query = aModelClass.query.filter_by(**filter_string).order_by(order_by)
-    items = user_filter(request, query, db_field_names, fk_fields)
-
-    # Write rows to CSV
-    for item in items:
-        row_data = []
-        for field in fields:
-            try:
-                row_data.append(getattr(item, field))
-            except AttributeError:
-                row_data.append('')
-        writer.writerow(row_data)
-
-    # Prepare response with CSV content
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename="{aPath.lower()}.csv"'
-
-    return response
+    if order_by not in meta.all_fields:
+        order_by = 'id'
+
+    return ExportSpec(meta.class_name, fields, prefs.filters, meta.db_fields,
+                      request.args.get('search'), meta.all_fields, tuple(meta.fk_relations), order_by,
+                      fulltext_backend(meta.model, request.args.get('search') or None))
+
+
+@blueprint.route('/export/<aPath>/job', methods=['POST'])
+@login_required
+def export_job(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 400
+
+    spec = export_spec(meta, aPath)
+    folder = config.Config.EXPORT_ARTIFACTS_DIR
+    artifact = artifact_name(aPath.lower(), spec)
+
+    # Same model, filters and ordering exported recently: reuse the file
+    if fresh_artifact(folder, artifact, config.Config.EXPORT_ARTIFACTS_TTL):
+        return jsonify({
+            'state': 'FINISHED',
+            'info': 'Recent export reused',
+            'artifact': artifact,
+            'download_url': url_for('table_blueprint.export_artifact', name=artifact),
+        })
+
+    # The same export already running: follow that job instead of starting another one
+    new_task_id = uuid.uuid4().hex
+    task_id = claim_export_job(folder, artifact, new_task_id, config.Config.EXPORT_ARTIFACTS_TTL)
+    if task_id == new_task_id:
+        try:
+            export_csv_job.apply_async(args=[json.dumps({
+                'artifact': artifact,
+                'spec': spec_to_json(spec),
+                'batch_size': config.Config.DYNAMIC_DATATB_EXPORT_BATCH,
+            })], task_id=task_id)
+        except Exception:
+            release_export_job(folder, artifact)
+            raise
+
+    return jsonify({
+        'task_id': task_id,
+        'state': 'PENDING',
+        'status_url': url_for('table_blueprint.export_job_status', task_id=task_id),
+    }), 202
+
+
+@blueprint.route('/export/job/<task_id>', methods=['GET'])
+@login_required
+def export_job_status(task_id):
+    result = celery_app.AsyncResult(task_id)
+
+    if result.failed():
+        return jsonify({'state': 'FAILURE', 'info': str(result.result)}), 500
+
+    if result.successful():
+        artifact = result.result['artifact']
+        return jsonify({
+            'state': 'FINISHED',
+            'info': 'Task is finished',
+            'current': result.result['total'],
+            'total': result.result['total'],
+            'artifact': artifact,
+            'download_url': url_for('table_blueprint.export_artifact', name=artifact),
+        })
+
+    meta = result.info if isinstance(result.info, dict) else {}
+    return jsonify({
+        'state': result.state,
+        'info': meta.get('info', 'Task is pending'),
+        'current': meta.get('current', 0),
+        'total': meta.get('total', 0),
+    })
+
+
+@blueprint.route('/export/artifact/<name>', methods=['GET'])
+@login_required
+def export_artifact(name):
+    return send_from_directory(config.Config.EXPORT_ARTIFACTS_DIR, name, as_attachment=True, mimetype='text/csv')
+
+
+@blueprint.route('/import/<aPath>', methods=['POST'])
+@login_required
+def import_csv_file(aPath):
+    meta = get_model_meta(aPath)
+    if not meta:
+        return jsonify({'error': f'ERR: Getting ModelClass for path: {aPath}'}), 400
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No CSV file uploaded'}), 400
+
+    batch_size = config.Config.DYNAMIC_DATATB_IMPORT_BATCH
+
+    # Large files are imported by a worker, the request only stores the upload
+    if (request.content_length or 0) > config.Config.DYNAMIC_DATATB_IMPORT_ASYNC_BYTES or request.args.get('job'):
+        folder = config.Config.IMPORT_UPLOADS_DIR
+        os.makedirs(folder, exist_ok=True)
+        file_path = os.path.join(folder, uuid.uuid4().hex + '.csv')
+        upload.save(file_path)
+
+        task = import_csv_job.delay(json.dumps({
+            'class_name': meta.class_name,
+            'file': file_path,
+            'batch_size': batch_size,
+        }))
+
+        return jsonify({
+            'task_id': task.id,
+            'state': 'PENDING',
+            'status_url': url_for('table_blueprint.import_job_status', task_id=task.id),
+        }), 202
+
+    try:
+        result = import_csv(db.session, meta.model, upload.stream, batch_size)
+    except ImportAborted as e:
+        return jsonify(dict(e.as_dict(), state='FAILED')), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    finally:
+        lookup_cache.invalidate(meta.model)
+        count_cache.invalidate(meta.model)
+
+    return jsonify({'state': 'FINISHED', 'import': result._asdict()})
+
+
+@blueprint.route('/import/job/<task_id>', methods=['GET'])
+@login_required
+def import_job_status(task_id):
+    result = celery_app.AsyncResult(task_id)
+
+    if result.failed():
+        return jsonify({'state': 'FAILURE', 'info': str(result.result)}), 500
+
+    if result.successful():
+        if 'error' in result.result:
+            return jsonify(dict(result.result['error'], state='FAILED')), 400
+        return jsonify({
+            'state': 'FINISHED',
+            'info': 'Task is finished',
+            'import': result.result['import'],
+        })
+
+    meta = result.info if isinstance(result.info, dict) else {}
+    return jsonify({
+        'state': result.state,
+        'info': meta.get('info', 'Task is pending'),
+        'current': meta.get('current', 0),
+        'total': meta.get('total', 0),
+        'rows': meta.get('rows', 0),
+    })
 
 
 # Template filter
@@ -0,0 +1,205 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import re
+from flask import current_app
+from sqlalchemy import text, select, or_, column, Enum, Integer, String, Text
+from sqlalchemy.dialects import postgresql
+from apps import db
+
+# Full-text search for DYNAMIC_DATATB models:
+#   sqlite     -> FTS5 external content table <table>_fts, synced by triggers
+#   postgresql -> GIN expression index over to_tsvector('simple', ...)
+# Other engines (or a missing index) fall back to the ILIKE search. The index
+# matches word prefixes of the String / Text columns: enum columns match by
+# member, the other columns keep ILIKE, and a search no indexed word starts
+# with (a substring such as "tem" of "item") runs the ILIKE search instead.
+
+FULLTEXT_DIALECTS = ('sqlite', 'postgresql')
+
+_available = {}
+
+
+def fulltext_columns(table):
+    return [
+        c.name for c in table.columns
+        if isinstance(c.type, (String, Text)) and not isinstance(c.type, Enum) and not c.foreign_keys
+    ]
+
+
+def fts_table(table):
+    return f'{table.name}_fts'
+
+
+def pg_document(table):
+    preparer = postgresql.dialect().identifier_preparer
+    columns = [f"coalesce({preparer.quote(name)}, '')" for name in fulltext_columns(table)]
+    return "to_tsvector('simple', {})".format(" || ' ' || ".join(columns))
+
+
+def pg_index(table):
+    return f'ix_{table.name}_fulltext'
+
+
+def setup_sqlite(connection, table):
+    preparer = connection.dialect.identifier_preparer
+    fts = fts_table(table)
+    names = fulltext_columns(table)
+    columns = ', '.join(preparer.quote(name) for name in names)
+    new_values = ', '.join(f'new.{preparer.quote(name)}' for name in names)
+    old_values = ', '.join(f'old.{preparer.quote(name)}' for name in names)
+
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+    ).first()
+
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, "
+        f"content='{table.name}', content_rowid='id', prefix='2 3')"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table.name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table.name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table.name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+
+    # Index the rows written before the triggers existed
+    if not exists:
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def setup_postgresql(connection, table):
+    document = pg_document(table)
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {pg_index(table)} ON {table.name} USING GIN (({document}))"
+    ))
+
+
+def setup_search_indexes(models):
+    """Creates (once) the full-text indexes of the given model classes; needs an app context."""
+    dialect = db.engine.dialect.name
+    if dialect not in FULLTEXT_DIALECTS:
+        return []
+
+    indexed = []
+    with db.engine.begin() as connection:
+        for aModelClass in models:
+            table = aModelClass.__table__
+            if not fulltext_columns(table):
+                continue
+
+            if dialect == 'sqlite':
+                setup_sqlite(connection, table)
+            else:
+                setup_postgresql(connection, table)
+
+            _available[table.name] = dialect
+            indexed.append(table.name)
+
+    return indexed
+
+
+def index_backend(aModelClass):
+    """Dialect name when the model has a usable full-text index, None otherwise (cached per process)."""
+    if not current_app.config.get('DYNAMIC_DATATB_FTS', True):
+        return None
+
+    table = aModelClass.__table__
+    if table.name in _available:
+        return _available[table.name]
+
+    backend = None
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        found = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts_table(table)}
+        ).first()
+    elif dialect == 'postgresql':
+        found = db.session.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {'name': pg_index(table)}
+        ).first()
+    else:
+        found = None
+
+    if found:
+        backend = dialect
+
+    _available[table.name] = backend
+    return backend
+
+
+def search_words(value):
+    return re.findall(r'\w+', value or '')
+
+
+def fulltext_match(table, words, backend):
+    """Rows whose indexed text has a word starting with each of `words`."""
+    if backend == 'sqlite':
+        match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        fts = fts_table(table)
+        matches = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :match").bindparams(match=match)
+        return table.c.id.in_(matches.columns(column('rowid', Integer)))
+
+    document = pg_document(table)
+    query = ' & '.join(f'{word}:*' for word in words)
+    return text(f"{document} @@ to_tsquery('simple', :query)").bindparams(query=query)
+
+
+def fulltext_backend(aModelClass, value=None):
+    """
+    Full-text backend of the model (see index_backend). With a search `value`, None as well
+    when no indexed row matches it: the ILIKE search then finds the substrings the word index cannot.
+    """
+    backend = index_backend(aModelClass)
+    if backend is None or value is None:
+        return backend
+
+    words = search_words(value)
+    if not words:
+        return None
+    table = aModelClass.__table__
+    found = db.session.execute(select(table.c.id).where(fulltext_match(table, words, backend)).limit(1)).first()
+    return backend if found else None
+
+
+def fulltext_clause(aModelClass, value, backend, fields, fk_fields=[]):
+    """
+    Criteria for the search box: every word of `value` must prefix-match a
+    word of the indexed text columns; numeric values also match integer
+    columns, enum columns match the members whose name contains `value`, and
+    the columns outside the index are searched with ILIKE.
+    Returns None when `value` has no searchable word.
+    """
+    words = search_words(value)
+    if not words:
+        return None
+
+    table = aModelClass.__table__
+    indexed = fulltext_columns(table)
+    criteria = [fulltext_match(table, words, backend)]
+
+    needle = value.strip().lower()
+    for c in table.columns:
+        if c.name not in fields or c.name in fk_fields or c.name in indexed:
+            continue
+        if isinstance(c.type, Enum):
+            members = [member for member in c.type.enums if needle in member.lower()]
+            if members:
+                criteria.append(c.in_(members))
+        elif isinstance(c.type, Integer):
+            if needle.isdigit():
+                criteria.append(c == int(needle))
+        else:
+            criteria.append(c.ilike(f"%{value}%"))
+
+    return or_(*criteria)
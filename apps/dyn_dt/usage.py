@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, json, time, atexit, threading
+from collections import Counter
+
+# Lightweight usage log of the datatable queries: which columns are filtered
+# (and how) and sorted per model. Hits are aggregated in memory and appended
+# to a JSON-lines file now and then; the index advisor reads it back. Past
+# `max_bytes` the file is rotated to <path>.1, the previous one is dropped.
+
+
+class UsageLog(object):
+
+    def __init__(self, flush_every=60, flush_size=500, max_bytes=10 * 1024 * 1024):
+        self.path = None
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.flush_size = flush_size
+        self._hits = Counter()
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def init_app(self, app):
+        self.path = app.config.get('DYNAMIC_DATATB_USAGE_LOG')
+        self.max_bytes = app.config.get('DYNAMIC_DATATB_USAGE_LOG_MAX_BYTES', self.max_bytes)
+
+    def record(self, model, filters=(), order_by='id', search=False):
+        """`filters` holds (column, operator) pairs of the applied saved filters."""
+        if not self.path:
+            return
+
+        shape = (model, tuple(sorted(set(filters))), order_by, bool(search))
+        with self._lock:
+            self._hits[shape] += 1
+            pending = sum(self._hits.values())
+
+        if pending >= self.flush_size or time.monotonic() - self._last_flush > self.flush_every:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            self._last_flush = time.monotonic()
+
+        if not hits or not self.path:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.rotate()
+        with open(self.path, 'a', encoding='utf-8') as log:
+            for (model, filters, order_by, search), count in hits.items():
+                log.write(json.dumps({
+                    'model': model, 'filters': filters, 'order_by': order_by, 'search': search, 'hits': count,
+                }) + '\n')
+
+    def rotate(self):
+        try:
+            if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+        except OSError:
+            pass
+
+
+def read_usage(path):
+    """Aggregated hits per (model, filters, order_by, search) shape, the rotated file included."""
+    hits = Counter()
+    if not path:
+        return hits
+
+    for name in (path + '.1', path):
+        if not os.path.isfile(name):
+            continue
+        with open(name, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                    filters = tuple(tuple(pair) for pair in entry['filters'])
+                    hits[(entry['model'], filters, entry['order_by'], entry['search'])] += entry['hits']
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return hits
+
+
+usage_log = UsageLog()
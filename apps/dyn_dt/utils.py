@@ -1,7 +1,10 @@
 import importlib
+from collections import namedtuple
 from sqlalchemy import or_
 from sqlalchemy import DateTime, func
 from apps import db 
+from apps.dyn_dt.search import fulltext_backend, fulltext_clause
+from apps.dyn_dt.filters import filter_clause, coerce_value
 
 class PageItems(db.Model):
     __tablename__ = 'page_items'
@@ -23,10 +26,15 @@ class ModelFilter(db.Model):
     parent = db.Column(db.String(255), nullable=True)
     key = db.Column(db.String(255), nullable=False)
     value = db.Column(db.String(255), nullable=False)
+    op = db.Column(db.String(16), nullable=True)
 
 
-def get_model_fk_values(aModelClass):
-    fk_values = {}
+FkRelation = namedtuple('FkRelation', ['model', 'column', 'attribute'])
+
+
+def get_model_fk_relations(aModelClass):
+    """Maps each MANYTOONE relationship name to its related model, local FK column and the attribute mapping it."""
+    fk_relations = {}
 
     current_table_name = aModelClass.__tablename__
 
@@ -37,11 +45,29 @@ def get_model_fk_values(aModelClass):
             referenced_table_name = list(foreign_key_column.foreign_keys)[0].column.table.name
 
             if referenced_table_name != current_table_name:
-                field_name = relationship.key
-                related_instances = related_model.query.all()
-                fk_values[field_name] = related_instances
+                attribute = aModelClass.__mapper__.get_property_by_column(foreign_key_column).key
+                fk_relations[relationship.key] = FkRelation(related_model, foreign_key_column.name, attribute)
+
+    return fk_relations
+
 
-    return fk_values
+def fk_column_value(aModelClass, relation, value):
+    """Form value of a FK field as its local column value, None when empty; raises ValueError for a malformed id."""
+    if not value:
+        return None
+    column = aModelClass.__table__.columns[relation.column]
+    try:
+        return coerce_value(column, str(value))
+    except ValueError:
+        raise ValueError(f'Invalid {relation.model.__name__} id: {value}')
+
+
+def get_model_fk_values(aModelClass):
+    """Every row of each related model; the datatable views use the lookup endpoint instead."""
+    return {
+        field_name: relation.model.query.all()
+        for field_name, relation in get_model_fk_relations(aModelClass).items()
+    }
 
 
 def get_model_field_names(model, field_type):
@@ -64,17 +90,38 @@ def name_to_class(name: str):
         return None
 
 
+def model_filter_clauses(aModelClass, filters, fields):
+    """Turns the saved ModelFilter rows of a model into SQL criteria."""
+    criteria = []
+    for filter_data in filters:
+        if filter_data.key in fields:
+            clause = filter_clause(aModelClass.__table__.columns[filter_data.key], filter_data.op, filter_data.value)
+            if clause is not None:
+                criteria.append(clause)
+    return criteria
+
+
+def search_clauses(aModelClass, value, fields, fk_fields=[]):
+    return [
+        getattr(aModelClass, field).ilike(f"%{value}%")
+        for field in fields if field not in fk_fields
+    ]
+
+
+def search_criteria(aModelClass, value, fields, fk_fields=[], fulltext=None):
+    """Full-text criteria when the model is indexed (`fulltext` backend), ILIKE over every column otherwise."""
+    clause = fulltext_clause(aModelClass, value, fulltext, fields, fk_fields) if fulltext else None
+    if clause is None:
+        clause = or_(*search_clauses(aModelClass, value, fields, fk_fields))
+    return clause
+
+
 def user_filter(request, query, fields, fk_fields=[]):
     value = request.args.get('search')
 
     if value:
-        dynamic_filter = []
-
-        for field in fields:
-            if field not in fk_fields:
-                dynamic_filter.append(getattr(query.column_descriptions[0]['entity'], field).ilike(f"%{value}%"))
-
-        query = query.filter(or_(*dynamic_filter))
+        aModelClass = query.column_descriptions[0]['entity']
+        query = query.filter(search_criteria(aModelClass, value, fields, fk_fields, fulltext_backend(aModelClass, value)))
 
     return query
 
@@ -0,0 +1,147 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import time, threading
+from collections import OrderedDict, Counter
+from werkzeug.exceptions import HTTPException
+
+# Full-page cache of the static home pages. It wraps the WSGI app, so a hit
+# is answered before Flask dispatches the request: no template rendering and
+# no minification, the stored body is the already minified output of the miss.
+# Pages only differ between anonymous and logged-in visitors, the key is
+# (path, segment, authenticated). Every app gets its own cache, kept in
+# app.extensions['page_cache'].
+
+
+def cached(segment):
+    """Marks a view as cacheable; `segment` is the sidebar entry it renders as active."""
+    def decorator(view):
+        view.page_cache_segment = segment
+        return view
+    return decorator
+
+
+class PageCache(object):
+
+    def __init__(self, app, wsgi_app, ttl=300, max_entries=256):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def cache_key(self, environ):
+        """Key of a cacheable request, None when the request has to reach the application."""
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD') or environ.get('QUERY_STRING'):
+            return None
+
+        app = self.app
+        try:
+            endpoint, _ = app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+
+        segment = getattr(app.view_functions.get(endpoint), 'page_cache_segment', None)
+        if segment is None:
+            return None
+
+        request = app.request_class(environ)
+        session = app.session_interface.open_session(app, request)
+        if session is None or '_flashes' in session:
+            return None
+
+        authenticated = '_user_id' in session
+        # a remember-me cookie logs the visitor in during the request, Flask-Login has to see it
+        if not authenticated and app.config.get('REMEMBER_COOKIE_NAME', 'remember_token') in request.cookies:
+            return None
+
+        return (request.path, segment, authenticated)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, status, headers, body):
+        with self._lock:
+            self._entries[key] = (status, headers, body, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def purge(self, path=None):
+        """Drops the cached pages of `path` (all pages by default); returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if path is None or key[0] == path]
+            for key in keys:
+                del self._entries[key]
+            self._counters['purged'] += len(keys)
+            return len(keys)
+
+    def count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self._counters['hits'] + self._counters['misses']
+            return {
+                'enabled' : self.ttl > 0,
+                'ttl'     : self.ttl,
+                'entries' : len(self._entries),
+                'hits'    : self._counters['hits'],
+                'misses'  : self._counters['misses'],
+                'purged'  : self._counters['purged'],
+                'hit_rate': round(self._counters['hits'] / requests, 3) if requests else 0.0,
+            }
+
+    def __call__(self, environ, start_response):
+        key = self.cache_key(environ)
+        if key is None:
+            return self.wsgi_app(environ, start_response)
+
+        entry = self.get(key)
+        if entry is not None:
+            self.count('hits')
+            status, headers, body, _ = entry
+            start_response(status, headers + [('X-Cache', 'HIT')])
+            return [b''] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+        self.count('misses')
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            return start_response(status, headers + [('X-Cache', 'MISS')], exc_info)
+
+        iterable = self.wsgi_app(environ, capture_start_response)
+        try:
+            body = b''.join(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+        status, headers = captured.get('status', ''), captured.get('headers', [])
+        # a response setting cookies (session, login) belongs to one visitor only
+        if (environ['REQUEST_METHOD'] == 'GET' and status.startswith('200')
+                and not any(name.lower() == 'set-cookie' for name, _ in headers)):
+            self.set(key, status, list(headers), body)
+
+        return [body]
+
+
+def init_app(app):
+    cache = PageCache(app, app.wsgi_app, app.config.get('PAGE_CACHE_TTL', 300),
+                      app.config.get('PAGE_CACHE_MAX_ENTRIES', 256))
+    app.extensions['page_cache'] = cache
+    if cache.ttl > 0:
+        app.wsgi_app = cache
@@ -0,0 +1,86 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, gzip, click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_minify.parsers import Parser
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Prerendered pages: the anonymous variant of every page cached by the page
+# cache (@cached) is written as minified HTML, plus .gz / .br
+# copies, for nginx to serve without reaching gunicorn (nginx/appseed-app.conf).
+
+
+def prerender_urls(app):
+    """(url, file name) of the cacheable pages; '/' and '/index' share index.html."""
+    urls = []
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if getattr(view, 'page_cache_segment', None) is None or rule.arguments:
+            continue
+        name = rule.rule.strip('/') or 'index'
+        urls.append((rule.rule, name + '.html'))
+    return sorted(urls)
+
+
+def write_file(path, data):
+    # nginx may be serving the previous version, replace it atomically
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def write_page(directory, name, html):
+    """Writes the page and its precompressed copies; returns the written paths."""
+    path = os.path.join(directory, name)
+    write_file(path, html)
+    write_file(path + '.gz', gzip.compress(html, compresslevel=9, mtime=0))
+    written = [path, path + '.gz']
+
+    if brotli is not None:
+        write_file(path + '.br', brotli.compress(html, mode=brotli.MODE_TEXT, quality=11))
+        written.append(path + '.br')
+    return written
+
+
+pages_cli = AppGroup('pages', help='Home pages.')
+
+
+@pages_cli.command('prerender')
+@click.option('--output', default=None, help='Target directory (default: PRERENDER_DIR).')
+def prerender(output):
+    """Writes the anonymous home pages as static, minified and precompressed HTML."""
+    app = current_app._get_current_object()
+    directory = output or app.config['PRERENDER_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    # htmlmin over the whole page, a stronger pass than the TEMPLATES_MINIFY whitespace stripping
+    parser = Parser(fail_safe=True)
+    parser.update_runtime_options(html=True, js=False, cssless=False)
+
+    client = app.test_client()
+    written = set()
+
+    for url, name in prerender_urls(app):
+        if name in written:
+            continue
+
+        response = client.get(url)
+        if response.status_code != 200:
+            raise click.ClickException(f'{url}: HTTP {response.status_code}')
+
+        html = parser.minify(response.get_data(as_text=True), 'html').encode('utf-8')
+        write_page(directory, name, html)
+        written.add(name)
+        click.echo(f' > {url:<18} {name} ({len(html):,} bytes)')
+
+    if brotli is None:
+        click.echo(' > brotli is not installed, no .br files written (pip install brotli)')
+    click.echo(f' > {len(written)} pages in {directory}')
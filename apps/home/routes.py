@@ -4,34 +4,56 @@ Copyright (c) 2019 - present AppSeed.us
 """
 import wtforms
 from apps.home import blueprint
-from flask import render_template, request, redirect, url_for
+from flask import render_template, request, redirect, url_for, jsonify, current_app
 from jinja2 import TemplateNotFound
 from flask_login import login_required, current_user
 from apps import db
 from apps.authentication.models import Users
 from flask_wtf import FlaskForm
+from apps.home.cache import cached
 
 @blueprint.route('/')
 @blueprint.route('/index')
+@cached(segment='dashboard')
 def index():
     return render_template('pages/index.html', segment='dashboard', parent="dashboard")
 
 @blueprint.route('/billing')
+@cached(segment='billing')
 def billing():
     return render_template('pages/billing.html', segment='billing')
 
 @blueprint.route('/rtl')
+@cached(segment='rtl')
 def rtl():
     return render_template('pages/rtl.html', segment='rtl')
 
 @blueprint.route('/tables')
+@cached(segment='tables')
 def tables():
     return render_template('pages/tables.html', segment='tables')
 
 @blueprint.route('/virtual_reality')
+@cached(segment='virtual_reality')
 def virtual_reality():
     return render_template('pages/virtual-reality.html', segment='virtual_reality')
 
+@blueprint.route('/page-cache')
+@login_required
+def page_cache_stats():
+    page_cache = current_app.extensions['page_cache']
+    return jsonify(dict(page_cache.stats(), fragments=current_app.jinja_env.fragment_cache.stats()))
+
+@blueprint.route('/page-cache/purge', methods=['POST'])
+@login_required
+def page_cache_purge():
+    if current_user.username not in current_app.config['PAGE_CACHE_ADMINS']:
+        return jsonify({'error': 'Purging the page cache is reserved to PAGE_CACHE_ADMINS'}), 403
+
+    page_cache = current_app.extensions['page_cache']
+    purged = page_cache.purge(request.form.get('path') or None)
+    return jsonify(dict(page_cache.stats(), purged_now=purged))
+
 
 def getField(column): 
     if isinstance(column.type, db.Text):
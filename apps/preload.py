@@ -0,0 +1,141 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, re, threading
+from flask import g, request, before_render_template
+from jinja2 import meta, TemplateError
+from apps.assets import url_for, references, resolve_reference
+
+# Preload hints: the stylesheets, scripts and fonts a page needs are read from
+# the url_for('static', ...) calls of its template, the templates it extends
+# or includes (jinja2.meta) and the fonts of those stylesheets. HTML responses
+# carry them as `Link: rel=preload` headers; servers exposing a
+# `wsgi.early_hints` callable also get them as 103 Early Hints, sent before
+# the view runs for endpoints whose template is known from an earlier request.
+# gunicorn and the Werkzeug server have no such callable, only the header is sent.
+
+# the other keyword arguments of the call (`v='1.1.0'`) are the query string of the URL the browser fetches
+STATIC_REFERENCE = re.compile(r'''url_for\(\s*['"]static['"]\s*,\s*filename\s*=\s*['"]([^'"]+)['"]((?:\s*,\s*\w+\s*=\s*['"][^'"]*['"])*)\s*\)''')
+STATIC_ARGUMENT = re.compile(r'''(\w+)\s*=\s*['"]([^'"]*)['"]''')
+
+PRELOAD_AS = {'.css': 'style', '.js': 'script', '.woff2': 'font'}
+
+
+class PreloadMap(object):
+    """Critical static files per template, analysed once per template and process."""
+
+    def __init__(self):
+        self._static = {}
+        self._preloads = {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def static_files(self, env, name):
+        """(filename, query arguments) of the static files referenced by the template and the templates it extends / includes."""
+        if name in self._static:
+            return self._static[name]
+        # guards reference cycles while the template is analysed
+        self._static[name] = []
+
+        try:
+            source = env.loader.get_source(env, name)[0]
+            referenced = meta.find_referenced_templates(env.parse(source))
+            files = [(filename, tuple(STATIC_ARGUMENT.findall(arguments)))
+                     for filename, arguments in STATIC_REFERENCE.findall(source)]
+            for template in referenced:
+                if template:
+                    files += self.static_files(env, template)
+        except TemplateError:
+            files = []
+
+        self._static[name] = list(dict.fromkeys(files))
+        return self._static[name]
+
+    def preloads(self, app, name):
+        """(filename, query arguments, as) to preload for the template: its CSS and JS, and the woff2 fonts of the CSS."""
+        if name in self._preloads:
+            return self._preloads[name]
+
+        with self._lock:
+            preloads = []
+            for filename, arguments in self.static_files(app.jinja_env, name):
+                ext = os.path.splitext(filename)[1].lower()
+                if ext not in ('.css', '.js'):
+                    continue
+                preloads.append((filename, arguments, PRELOAD_AS[ext]))
+                if ext == '.css':
+                    preloads += [(font, (), 'font') for font in css_fonts(app.static_folder, filename)]
+
+            self._preloads[name] = list(dict.fromkeys(preloads))
+            return self._preloads[name]
+
+    def remember(self, endpoint, name):
+        self._endpoints[endpoint] = name
+
+    def template_of(self, endpoint):
+        return self._endpoints.get(endpoint)
+
+
+preload_map = PreloadMap()
+
+
+def css_fonts(static_folder, filename):
+    try:
+        with open(os.path.join(static_folder, *filename.split('/')), 'rb') as f:
+            content = f.read()
+    except OSError:
+        return []
+
+    fonts = (resolve_reference(filename, match.group(2)) for match in references(filename, content))
+    return [font for font in fonts if font and font.endswith('.woff2')]
+
+
+def link_header(preloads):
+    links = []
+    for filename, arguments, kind in preloads:
+        link = '<{}>; rel=preload; as={}'.format(url_for('static', filename=filename, **dict(arguments)), kind)
+        if kind == 'font':
+            # fonts are fetched in CORS mode, the preload has to match
+            link += '; type="font/woff2"; crossorigin'
+        links.append(link)
+    return ', '.join(links)
+
+
+def init_app(app):
+    if not app.config.get('PRELOAD_HEADERS'):
+        return
+
+    # the layouts are analysed at startup, pages on their first render (they share the layout entries)
+    for name in app.jinja_env.list_templates():
+        if name.startswith('layouts/'):
+            preload_map.preloads(app, name)
+
+    def record_template(sender, template, context, **extra):
+        # the first template rendered is the page, later ones are fragments of it
+        if 'preload_template' not in g:
+            g.preload_template = template.name
+
+    before_render_template.connect(record_template, app, weak=False)
+
+    @app.before_request
+    def send_early_hints():
+        send = request.environ.get('wsgi.early_hints')
+        name = preload_map.template_of(request.endpoint)
+        if callable(send) and name and request.method == 'GET':
+            preloads = preload_map.preloads(app, name)
+            if preloads:
+                send([('Link', link_header(preloads))])
+
+    @app.after_request
+    def add_preload_header(response):
+        name = g.get('preload_template')
+        if not name or response.status_code != 200 or response.mimetype != 'text/html':
+            return response
+
+        preload_map.remember(request.endpoint, name)
+        preloads = preload_map.preloads(app, name)
+        if preloads:
+            response.headers.add('Link', link_header(preloads))
+        return response
@@ -3,7 +3,7 @@
 Copyright (c) 2019 - present AppSeed.us
 """
 
-import json, time
+import os, json, time
 from datetime import datetime
 
 from apps.config import *
@@ -98,4 +98,169 @@ def celery_test( self, task_input ):
 @celery_app.task(name="celery_beat_test", bind=True)
 def celery_beat_test( self, task_input ):
     task_json = {'info': 'Beat is running'}
-    return task_json
\ No newline at end of file
+    return task_json
+
+
+# export a DYNAMIC_DATATB model to a CSV artifact
+@celery_app.task(name="export_csv_job", bind=True)
+def export_csv_job( self, task_input ):
+
+    from sqlalchemy.orm import Session
+    from apps.dyn_dt.utils import name_to_class
+    from apps.dyn_dt.export import get_engine, spec_from_json, write_csv_artifact, expire_artifacts, release_export_job
+
+    task_json = json.loads( task_input )
+
+    logger.info( '*** Export Started' )
+    logger.info( ' > artifact:' + task_json['artifact'] )
+
+    task_json['result'] = 'NA'
+    task_json['ts_start'] = datetime.now()
+
+    # ######################################################
+    # Task is STARTING (prepare the task)
+
+    task_json['state'] = 'STARTING'
+    task_json['info'] = 'Task is starting'
+
+    self.update_state(state='STARTING',
+                      meta={ 'info':'Task is starting', 'current': 0, 'total': 0 })
+
+    folder      = Config.EXPORT_ARTIFACTS_DIR
+    spec        = spec_from_json( task_json['spec'] )
+    aModelClass = name_to_class( spec.class_name )
+    file_path   = os.path.join( folder, task_json['artifact'] )
+
+    # artifacts past their TTL are never reused, drop them
+    expired = expire_artifacts( folder, Config.EXPORT_ARTIFACTS_TTL )
+    if expired:
+        logger.info( ' > expired artifacts removed: ' + str( expired ) )
+
+    # ######################################################
+    # Task is RUNNING (execute MAIN stuff)
+
+    task_json['state'] = 'RUNNING'
+    task_json['info'] = 'Task is running'
+
+    def progress(current, total):
+        self.update_state(state='RUNNING',
+                          meta={ 'info':'Task is running', 'current': current, 'total': total })
+
+    # the worker loads the same Config as the app, the DB URI (and its password) stays out of the broker
+    try:
+        with Session( get_engine( Config.SQLALCHEMY_DATABASE_URI ) ) as session:
+            total = write_csv_artifact(session, aModelClass, spec, file_path, task_json['batch_size'], progress)
+    finally:
+        # identical requests start a new job from now on (or reuse the artifact)
+        release_export_job( folder, task_json['artifact'] )
+
+    # ######################################################
+    # Task is CLOSING (task cleanUP)
+
+    task_json['state'] = 'CLOSING'
+    task_json['info'] = 'Task is closing'
+
+    self.update_state(state='CLOSING',
+                      meta={ 'info':'Task is running the cleanUP', 'current': total, 'total': total })
+
+    task_json['ts_end'] = datetime.now()
+
+    # ######################################################
+    # Task is FINISHED (task cleanUP)
+
+    task_json['state'] = 'FINISHED'
+    task_json['info'] = 'Task is finished'
+    task_json['result'] = 'SUCCESS'
+    task_json['total'] = total
+
+    self.update_state(state='FINISHED',
+                      meta={ 'info':'Task is finished', 'current': total, 'total': total })
+
+    return task_json
+
+
+# bulk import a CSV upload into a DYNAMIC_DATATB model
+@celery_app.task(name="import_csv_job", bind=True)
+def import_csv_job( self, task_input ):
+
+    from sqlalchemy.orm import Session
+    from apps.dyn_dt.utils import name_to_class
+    from apps.dyn_dt.export import get_engine
+    from apps.dyn_dt.importer import import_csv, ImportAborted
+
+    task_json = json.loads( task_input )
+
+    logger.info( '*** Import Started' )
+    logger.info( ' > file:' + task_json['file'] )
+
+    task_json['result'] = 'NA'
+    task_json['ts_start'] = datetime.now()
+
+    # ######################################################
+    # Task is STARTING (prepare the task)
+
+    task_json['state'] = 'STARTING'
+    task_json['info'] = 'Task is starting'
+
+    total_bytes = os.path.getsize( task_json['file'] )
+
+    self.update_state(state='STARTING',
+                      meta={ 'info':'Task is starting', 'current': 0, 'total': total_bytes, 'rows': 0 })
+
+    aModelClass = name_to_class( task_json['class_name'] )
+
+    # ######################################################
+    # Task is RUNNING (execute MAIN stuff)
+
+    task_json['state'] = 'RUNNING'
+    task_json['info'] = 'Task is running'
+
+    def progress(rows, bytes_read):
+        self.update_state(state='RUNNING',
+                          meta={ 'info':'Task is running', 'current': bytes_read, 'total': total_bytes, 'rows': rows })
+
+    # the worker loads the same Config as the app, the DB URI (and its password) stays out of the broker
+    try:
+        with Session( get_engine( Config.SQLALCHEMY_DATABASE_URI ) ) as session, open( task_json['file'], 'rb' ) as upload:
+            result = import_csv(session, aModelClass, upload, task_json['batch_size'], progress=progress)
+
+    # the rejected batch is rolled back, the rows committed before it stay
+    except ImportAborted as e:
+        logger.error( ' > Import aborted at line ' + str(e.line) + ': ' + str(e) )
+
+        task_json['state'] = 'FAILED'
+        task_json['info'] = 'Task failed'
+        task_json['result'] = 'FAILURE'
+        task_json['error'] = e.as_dict()
+        task_json['ts_end'] = datetime.now()
+
+        self.update_state(state='FAILED',
+                          meta={ 'info':'Task failed', 'current': total_bytes, 'total': total_bytes, 'rows': e.committed })
+        return task_json
+
+    # ######################################################
+    # Task is CLOSING (task cleanUP)
+
+    finally:
+        os.remove( task_json['file'] )
+
+    task_json['state'] = 'CLOSING'
+    task_json['info'] = 'Task is closing'
+
+    self.update_state(state='CLOSING',
+                      meta={ 'info':'Task is running the cleanUP', 'current': total_bytes, 'total': total_bytes, 'rows': result.inserted })
+
+    task_json['ts_end'] = datetime.now()
+
+    # ######################################################
+    # Task is FINISHED (task cleanUP)
+
+    task_json['state'] = 'FINISHED'
+    task_json['info'] = 'Task is finished'
+    task_json['result'] = 'SUCCESS'
+    task_json['import'] = result._asdict()
+
+    self.update_state(state='FINISHED',
+                      meta={ 'info':'Task is finished', 'current': total_bytes, 'total': total_bytes, 'rows': result.inserted })
+
+    return task_json
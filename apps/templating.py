@@ -0,0 +1,283 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+import os, re, time, threading, uuid, click
+from collections import OrderedDict, Counter
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import nodes, FileSystemBytecodeCache, TemplateError
+from jinja2.ext import Extension
+
+# Fragment cache for the layout includes:
+#
+#   {% cache segment, current_user.is_authenticated %} ... {% endcache %}
+#   {% cache ttl 3600 %} ... {% endcache %}
+#
+# The rendered block is stored per (block, key values) in the process, for
+# TEMPLATE_FRAGMENT_CACHE_TTL seconds unless the tag gives its own `ttl`.
+# The key values have to name everything the block depends on.
+
+
+class FragmentCache(object):
+    """Rendered fragments with a TTL, least recently used ones evicted past `max_entries`."""
+
+    def __init__(self, ttl=300, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl'    : self.ttl,
+                'entries': len(self._entries),
+                'hits'   : self._counters['hits'],
+                'misses' : self._counters['misses'],
+            }
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        # a new id on every compile, a reloaded template does not reuse stale fragments
+        block = '{}:{}:{}'.format(parser.name, lineno, uuid.uuid4().hex[:8])
+
+        keys = []
+        while parser.stream.current.type != 'block_end' and not parser.stream.current.test('name:ttl'):
+            if keys:
+                parser.stream.expect('comma')
+            keys.append(parser.parse_expression())
+
+        ttl = parser.parse_expression() if parser.stream.skip_if('name:ttl') else nodes.Const(None)
+
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render_cached', [nodes.Const(block), nodes.List(keys), ttl])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, block, keys, ttl, caller):
+        cache = self.environment.fragment_cache
+        if (cache.ttl if ttl is None else ttl) <= 0:
+            return caller()
+
+        key = (block,) + tuple(repr(value) for value in keys)
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = caller()
+            cache.set(key, rendered, ttl)
+        return rendered
+
+
+# Minification at compile time: with TEMPLATES_MINIFY the .html sources are
+# whitespace-stripped once, before Jinja compiles them, instead of running an
+# HTML minifier over every response. Jinja tags, {% raw %} blocks, <script>,
+# <style>, <pre> and <textarea> elements are kept verbatim; whitespace runs
+# keep their line breaks so template errors still point at the right line.
+
+MINIFY_TOKENS = re.compile(r'''
+    (?P<raw>{%-?\s*raw\s*-?%}.*?{%-?\s*endraw\s*-?%})
+  | (?P<verbatim><(?P<tag>script|style|pre|textarea)\b.*?</(?P=tag)\s*>)
+  | (?P<comment><!--.*?-->)
+  | (?P<jinja>{%.*?%}|{{.*?}}|{\#.*?\#})
+''', re.S | re.I | re.X)
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def collapse_whitespace(text):
+    return WHITESPACE.sub(lambda match: '\n' * match.group().count('\n') or ' ', text)
+
+
+def minify_source(source):
+    """Jinja HTML source without indentation and HTML comments; the rendered markup is unchanged."""
+    parts, text, position = [], [], 0
+
+    for match in MINIFY_TOKENS.finditer(source):
+        text.append(source[position:match.start()])
+        position = match.end()
+
+        comment = match.group('comment')
+        # conditional comments and comments holding template code stay
+        if comment and not comment.startswith('<!--[if') and not re.search(r'{[{%#]', comment):
+            text.append('\n' * comment.count('\n'))
+            continue
+
+        parts.append(collapse_whitespace(''.join(text)))
+        parts.append(match.group())
+        text = []
+
+    text.append(source[position:])
+    parts.append(collapse_whitespace(''.join(text)))
+    return ''.join(parts)
+
+
+class MinifyExtension(Extension):
+
+    def preprocess(self, source, name, filename=None):
+        if name and name.endswith('.html'):
+            return minify_source(source)
+        return source
+
+
+# Compiled templates are kept as bytecode in JINJA_BYTECODE_CACHE_DIR, shared
+# by the workers and kept across restarts; with TEMPLATES_WARMUP every
+# template is loaded (compiled or read from the bytecode cache) in create_app,
+# before the first request.
+
+
+def template_names(env):
+    return [name for name in env.list_templates() if name.endswith('.html')]
+
+
+def warm_up(env, names=None):
+    """Loads every template; returns (name, seconds) pairs and the names that failed."""
+    timings, failed = [], []
+    for name in names or template_names(env):
+        ts_start = time.perf_counter()
+        try:
+            env.get_template(name)
+        except TemplateError as e:
+            failed.append((name, str(e)))
+            continue
+        timings.append((name, time.perf_counter() - ts_start))
+    return timings, failed
+
+
+def compile_times(env, names=None):
+    """(name, source bytes, seconds) of a compile from source, bypassing every cache; slowest first."""
+    report = []
+    for name in names or template_names(env):
+        source, filename, _ = env.loader.get_source(env, name)
+        ts_start = time.perf_counter()
+        try:
+            env.compile(source, name, filename)
+        except TemplateError:
+            continue
+        report.append((name, len(source.encode('utf-8')), time.perf_counter() - ts_start))
+    return sorted(report, key=lambda item: item[2], reverse=True)
+
+
+templates_cli = AppGroup('templates', help='Jinja template compilation.')
+
+
+@templates_cli.command('report')
+@click.option('--limit', default=0, help='Show the slowest templates only.')
+def compile_report(limit):
+    """Per-template compile time (from source) and load time (through the bytecode cache)."""
+    env = current_app.jinja_env
+    report = compile_times(env)
+    if env.cache is not None:
+        env.cache.clear()
+    loads = dict(warm_up(env, [name for name, _, _ in report])[0])
+
+    click.echo('{:<45} {:>9} {:>12} {:>10}'.format('template', 'bytes', 'compile ms', 'load ms'))
+    for name, size, seconds in report[:limit or None]:
+        click.echo('{:<45} {:>9,} {:>12.2f} {:>10.2f}'.format(name, size, seconds * 1000, loads.get(name, 0) * 1000))
+
+    total = sum(seconds for _, _, seconds in report)
+    click.echo(' > {} templates, {:.1f} ms compile total'.format(len(report), total * 1000))
+
+
+@templates_cli.command('warmup')
+def warmup_command():
+    """Compiles every template into the bytecode cache."""
+    timings, failed = warm_up(current_app.jinja_env)
+    for name, message in failed:
+        click.echo(f' > Error: {name}: {message}')
+    click.echo(' > {} templates loaded in {:.1f} ms'.format(len(timings), sum(seconds for _, seconds in timings) * 1000))
+
+
+@templates_cli.command('benchmark')
+@click.argument('urls', nargs=-1)
+@click.option('--requests', 'count', default=50, show_default=True, help='Requests per URL and setup.')
+def minify_benchmark(urls, count):
+    """Latency and CPU per request: Flask-Minify on every response against minified templates."""
+    from flask_minify import Minify
+    from apps import create_app
+
+    # flask-minify keeps the output of two response bodies per endpoint; pages whose content
+    # changes between requests (datatables, logged-in views) miss that memo, 'flask-minify-miss'
+    setups = []
+    for label, minify_templates, bypass_caching in (('flask-minify', False, []), ('flask-minify-miss', False, ['.*']),
+                                                    ('templates', True, None)):
+        # a copy of the running configuration, without the page cache that would answer every repeat
+        config = type('BenchmarkConfig', (object,), dict(current_app.config, PAGE_CACHE_TTL=0,
+                                                          TEMPLATES_WARMUP=False, TEMPLATES_MINIFY=minify_templates,
+                                                          JINJA_BYTECODE_CACHE_DIR=''))
+        app = create_app(config)
+        if bypass_caching is not None:
+            Minify(app=app, html=True, js=False, cssless=False, bypass_caching=bypass_caching)
+        setups.append((label, app))
+
+    if not urls:
+        paths = list(current_app.config.get('DYNAMIC_DATATB', {}))[:1]
+        urls = ['/', '/tables', '/charts'] + ['/dynamic-dt/' + path for path in paths]
+
+    click.echo('{:<28} {:<18} {:>10} {:>10} {:>10}'.format('url', 'setup', 'ms/req', 'cpu ms', 'bytes'))
+    for url in urls:
+        for label, app in setups:
+            client = app.test_client()
+            size = len(client.get(url).data)
+
+            wall, cpu = time.perf_counter(), time.process_time()
+            for _ in range(count):
+                client.get(url)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+            click.echo('{:<28} {:<18} {:>10.2f} {:>10.2f} {:>10,}'.format(url, label, wall / count * 1000, cpu / count * 1000, size))
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    if app.config.get('TEMPLATES_MINIFY'):
+        app.jinja_env.add_extension(MinifyExtension)
+    cache = app.jinja_env.fragment_cache
+    cache.ttl = app.config.get('TEMPLATE_FRAGMENT_CACHE_TTL', 300)
+    cache.max_entries = app.config.get('TEMPLATE_FRAGMENT_CACHE_MAX_ENTRIES', 512)
+
+    bytecode_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        # minified and plain bytecode of the same source must not be mixed up
+        pattern = '__jinja2_%s.min.cache' if app.config.get('TEMPLATES_MINIFY') else '__jinja2_%s.cache'
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir, pattern)
+
+    app.cli.add_command(templates_cli)
+
+    if app.config.get('TEMPLATES_WARMUP'):
+        timings, failed = warm_up(app.jinja_env)
+        for name, message in failed:
+            print(f'> Error: Template warm-up: {name}: {message}')
+        print(' > TEMPLATES:        {} loaded in {:.2f} ms'.format(len(timings), sum(seconds for _, seconds in timings) * 1000))
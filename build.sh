@@ -11,5 +11,6 @@ pip install -r requirements.txt
 # Init migration folder
 # flask db init # to be executed only once
 
+flask db upgrade # Apply the shipped revisions
 flask db migrate # Generate migration SQL
 flask db upgrade # Apply changes
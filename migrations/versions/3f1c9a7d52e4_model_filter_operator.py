@@ -0,0 +1,32 @@
+"""model_filter operator
+
+Revision ID: 3f1c9a7d52e4
+Revises: 
+Create Date: 2026-10-18 11:02:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d52e4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def model_filter_columns():
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns('model_filter')}
+
+
+def upgrade():
+    # run.py creates the tables of a new database (db.create_all) with the column already there
+    if 'op' not in model_filter_columns():
+        with op.batch_alter_table('model_filter', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('op', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('model_filter', schema=None) as batch_op:
+        batch_op.drop_column('op')
@@ -5,11 +5,12 @@ Copyright (c) 2019 - present AppSeed.us
 
 import os
 from   flask_migrate import Migrate
-from   flask_minify  import Minify
 from   sys import exit
 
 from apps.config import config_dict
 from apps import create_app, db
+from apps.dyn_dt.search import setup_search_indexes
+from apps.dyn_dt.lookup import setup_lookup_indexes
 
 # WARNING: Don't run with debug turned on in production!
 DEBUG = (os.getenv('DEBUG', 'False') == 'True')
@@ -43,12 +44,25 @@ with app.app_context():
         print('> Fallback to SQLite ')
         db.create_all()
 
+# Full-text search indexes for the DYNAMIC_DATATB models
+if app.config['DYNAMIC_DATATB_FTS']:
+    with app.app_context():
+        try:
+            setup_search_indexes([meta.model for meta in app.extensions['dyn_dt_registry'].models.values()])
+        except Exception as e:
+            print('> Error: Full-text index setup: ' + str(e) )
+
+# Case-insensitive prefix indexes of the FK typeahead lookups
+with app.app_context():
+    try:
+        setup_lookup_indexes({relation.model for meta in app.extensions['dyn_dt_registry'].models.values()
+                                             for relation in meta.fk_relations.values()})
+    except Exception as e:
+        print('> Error: Lookup index setup: ' + str(e) )
+
 # Apply all changes
 Migrate(app, db)
 
-if not DEBUG:
-    Minify(app=app, html=True, js=False, cssless=False)
-    
 if DEBUG:
     app.logger.info('DEBUG            = ' + str(DEBUG)             )
     app.logger.info('Page Compression = ' + 'FALSE' if DEBUG else 'TRUE' )